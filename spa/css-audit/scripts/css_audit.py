@@ -8,20 +8,41 @@ Analyzes CSS files and HTML/JS templates to identify:
 - Risk classification
 """
 
+import csv
 import glob
 import os
 import re
 import json
+import mmap
+import pickle
 import hashlib
 import argparse
-import cssutils
-import pandas as pd
+import functools
+import itertools
 from pathlib import Path
-from collections import defaultdict
-from bs4 import BeautifulSoup
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
 
-# Suppress cssutils parsing warnings
-cssutils.log.setLevel(40)  # ERROR level only
+# Non-cryptographic hash for duplicate detection - prefer xxhash when installed
+try:
+    import xxhash
+    def _fingerprint(data):
+        return xxhash.xxh3_64_hexdigest(data)
+except ImportError:
+    def _fingerprint(data):
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+# JSON report writer - orjson serializes the large full-audit map much faster when installed
+try:
+    import orjson
+    def write_json(path, data):
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+except ImportError:
+    def write_json(path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
 
 # Risk classification properties
 HIGH_RISK_PROPS = {
@@ -38,6 +59,13 @@ MED_RISK_PROPS = {
     'margin-inline', 'margin-block', 'padding-inline', 'padding-block'
 }
 
+# Longhand prefixes (e.g. "grid-" matches "grid-area"), checked in one str.startswith call
+_HIGH_RISK_PREFIXES = tuple(prop + '-' for prop in HIGH_RISK_PROPS)
+_MED_RISK_PREFIXES = tuple(prop + '-' for prop in MED_RISK_PROPS)
+
+# Column order for css-audit.csv
+CSV_FIELDS = ['class', 'risk', 'usage_count', 'component', 'files', 'duplicate_group', 'merge_candidates']
+
 # Component mapping - adjust based on your actual component names
 COMPONENT_MAP = {
     # Modal components
@@ -244,6 +272,178 @@ COMPONENT_MAP = {
     'top-bar': 'TopBar'
 }
 
+# On-disk extraction cache (enabled by init_cache); None disables caching
+_CACHE_DIR = None
+
+def init_cache(cache_dir):
+    """Enable the extraction cache, discarding stale entries if this script has changed"""
+    global _CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    # Any change to the extractors or constants in this file invalidates the cache
+    with open(__file__, 'rb') as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()
+    
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    
+    if meta.get('fingerprint') != fingerprint:
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
+        with open(meta_path, 'w') as f:
+            json.dump({'fingerprint': fingerprint}, f)
+    
+    _CACHE_DIR = cache_dir
+
+def _cache_path(kind, path):
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(_CACHE_DIR, f"{kind}-{digest}.pkl")
+
+def _cache_lookup(kind, path):
+    """Return (key, cached_value); cached_value is None on a miss"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    try:
+        with open(_cache_path(kind, path), 'rb') as f:
+            cached_key, value = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return key, None
+    return key, value if cached_key == key else None
+
+def _cache_store(kind, path, key, value):
+    cache_file = _cache_path(kind, path)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: could not write cache entry for {path}: {e}")
+
+def _init_worker(cache_dir):
+    """Process pool initializer - share the parent's cache directory with workers"""
+    global _CACHE_DIR
+    _CACHE_DIR = cache_dir
+
+def cached_extraction(kind):
+    """Memoize a per-file extractor on disk, keyed by the file's (mtime, size)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(path):
+            if _CACHE_DIR is None:
+                return func(path)
+            key, value = _cache_lookup(kind, path)
+            if value is None:
+                value = func(path)
+                _cache_store(kind, path, key, value)
+            return value
+        return wrapper
+    return decorator
+
+# Hash-consing table for declaration sets (many classes share identical rule bodies)
+_DECLARATION_SETS = {}
+
+# Precompiled patterns for extract_classes_from_html_js
+_RE_CLASSNAME = re.compile(r'className\s*=\s*[\'"]([^\'"]*)[\'"]')
+_RE_CLASS_ATTR = re.compile(r'class=[\'"]([^\'"]*)[\'"]')
+_RE_TEMPLATE_EXPR = re.compile(r'\$\{[^}]*\}')
+_RE_CLASSLIST = re.compile(r'\.classList\.(?:add|toggle|replace)\([\'"]([^\'"]+)[\'"]')
+_RE_ELEMENT_CLASSNAME = re.compile(r'createElement\(.*?\);\s*.*?\.className\s*=\s*[\'"]([^\'"]*)[\'"]', re.DOTALL)
+_RE_VAR_CLASSNAME = re.compile(r'(?:var|let|const)\s+\w+\s*=\s*[\'"]([^\'"]*)[\'"];\s*.*?\.className')
+_RE_CREATE_EL_CLASSNAME = re.compile(r'createElement\([\'"][a-zA-Z0-9]+[\'"]\)[^;]*?className\s*=\s*[\'"]([^\'"]*)[\'"]')
+_RE_QUOTED_IDENT = re.compile(r'[\'"]([a-zA-Z0-9_-]+(?:-[a-zA-Z0-9_-]+)*)[\'"]')
+# Characters a CSS class name is made of; used to tokenize files for usage counting
+_RE_CLASS_TOKEN = re.compile(rb'[a-zA-Z0-9_-]+')
+
+# Files at least this large are scanned through mmap instead of being read into memory
+MMAP_THRESHOLD = 64 * 1024
+
+# HTML class attributes as an HTML parser sees them: any case, spaces around "=", unquoted values
+_RE_HTML_CLASS_ATTR = re.compile(
+    r'(?<![\w:-])class\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+))', re.IGNORECASE
+)
+_RE_KEBAB_CASE = re.compile(r'^[a-zA-Z0-9]+-[a-zA-Z0-9-]+$')
+
+# Lightweight CSS tokenizer patterns - the audit only needs selectors and flat
+# "name: value" declaration strings, so a full CSS object model is not required
+_RE_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_RE_CSS_BLOCK_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]')
+_RE_CSS_DECLARATION = re.compile(
+    r'(-?-?[a-zA-Z_][\w-]*)\s*:\s*'
+    r'((?:"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\([^)]*\)|[^;"\'(])+)'
+)
+_RE_CSS_IMPORTANT = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+_RE_SELECTOR_CLASS = re.compile(r'\.([a-zA-Z0-9_-]+)(?:::?[a-zA-Z-]+)?')
+
+def iter_style_rules(css_content):
+    """Yield (prelude, body) for each top-level style rule, skipping at-rules"""
+    css_content = _RE_CSS_COMMENT.sub('', css_content)
+    depth = 0
+    start = 0
+    body_start = 0
+    prelude = ''
+    
+    for token in _RE_CSS_BLOCK_TOKEN.finditer(css_content):
+        char = token.group()
+        if char == '{':
+            if depth == 0:
+                prelude = css_content[start:token.start()].strip()
+                body_start = token.end()
+            depth += 1
+        elif char == '}':
+            if depth == 0:
+                # Stray closing brace - resynchronise after it
+                start = token.end()
+                continue
+            depth -= 1
+            if depth == 0:
+                # @media, @keyframes, @font-face etc. are not plain style rules
+                if prelude and not prelude.startswith('@'):
+                    yield prelude, css_content[body_start:token.start()]
+                start = token.end()
+        elif char == ';' and depth == 0:
+            # Statement at-rules such as @import / @charset
+            start = token.end()
+
+def split_selectors(prelude):
+    """Split a selector list on top-level commas (ignoring commas inside :not(...) etc.)"""
+    selectors = []
+    depth = 0
+    current = []
+    for char in prelude:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth = max(depth - 1, 0)
+        elif char == ',' and depth == 0:
+            selectors.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    selectors.append(''.join(current))
+    return [' '.join(sel.split()) for sel in selectors if sel.strip()]
+
+def parse_declarations(body):
+    """Return the rule's declarations as a {name: value} dict (last value per property wins)"""
+    properties = {}
+    for match in _RE_CSS_DECLARATION.finditer(body):
+        name = match.group(1).lower()
+        value = _RE_CSS_IMPORTANT.sub('', ' '.join(match.group(2).split()))
+        if value:
+            properties[name] = value
+    return properties
+
+def intern_declarations(declarations):
+    """Return the canonical frozenset for a declaration set, so equal sets share one object"""
+    declarations = frozenset(declarations)
+    return _DECLARATION_SETS.setdefault(declarations, declarations)
+
+@cached_extraction('css')
 def extract_classes_from_css(css_file):
     """Extract CSS classes and their declarations from a CSS file"""
     with open(css_file, 'r', encoding='utf-8') as f:
@@ -251,49 +451,47 @@ def extract_classes_from_css(css_file):
     
     # Parse the CSS
     try:
-        stylesheet = cssutils.parseString(css_content)
-        
         class_map = {}
         source_file = os.path.basename(css_file)
         
-        for rule in stylesheet:
-            # Check if it's a style rule (not @media, @import, etc.)
-            if rule.type == cssutils.css.CSSRule.STYLE_RULE:
-                for selector in rule.selectorList:
-                    selector_text = selector.selectorText
-                    
-                    # Extract class name (handle multiple classes and pseudo-classes)
-                    class_matches = re.findall(r'\.([a-zA-Z0-9_-]+)(?:::?[a-zA-Z-]+)?', selector_text)
-                    
-                    if not class_matches:
-                        continue
-                        
-                    # Get declarations as a set of strings
-                    declarations = set()
-                    for prop in rule.style:
-                        # Changed this line to avoid the 'type' attribute error
-                        if not isinstance(prop, cssutils.css.CSSComment):
-                            declarations.add(f"{prop.name}: {prop.value}")
-                    
-                    # Add each class to the map
-                    for class_name in class_matches:
-                        if class_name not in class_map:
-                            class_map[class_name] = {
-                                'declarations': declarations,
-                                'files': {source_file},
-                                'count': 0,
-                                'selectors': {selector_text}
-                            }
-                        else:
-                            class_map[class_name]['declarations'].update(declarations)
-                            class_map[class_name]['files'].add(source_file)
-                            class_map[class_name]['selectors'].add(selector_text)
+        # Only plain style rules are considered (not @media, @import, etc.)
+        for prelude, body in iter_style_rules(css_content):
+            # Get declarations as a (shared) frozenset of "name: value" strings, plus the
+            # bare property names so risk classification needs no string splitting
+            parsed = parse_declarations(body)
+            declarations = intern_declarations(f"{name}: {value}" for name, value in parsed.items())
+            properties = frozenset(parsed)
+            
+            for selector_text in split_selectors(prelude):
+                # Extract class name (handle multiple classes and pseudo-classes)
+                class_matches = _RE_SELECTOR_CLASS.findall(selector_text)
+                
+                if not class_matches:
+                    continue
+                
+                # Add each class to the map
+                for class_name in class_matches:
+                    entry = class_map.get(class_name)
+                    if entry is None:
+                        class_map[class_name] = {
+                            'declarations': declarations,
+                            'properties': properties,
+                            'files': {source_file},
+                            'count': 0,
+                            'selectors': {selector_text}
+                        }
+                    else:
+                        entry['declarations'] = intern_declarations(entry['declarations'] | declarations)
+                        entry['properties'] = entry['properties'] | properties
+                        entry['files'].add(source_file)
+                        entry['selectors'].add(selector_text)
     except Exception as e:
         print(f"Error parsing CSS file {css_file}: {e}")
         return {}
     
     return class_map
 
+@cached_extraction('html_js')
 def extract_classes_from_html_js(file_path):
     """Extract classes used in HTML files and className in JS files"""
     with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -303,80 +501,74 @@ def extract_classes_from_html_js(file_path):
     
     # Match patterns for JS class assignments:
     
-    # 1. Match className = "class1 class2"
-    className_matches = re.findall(r'className\s*=\s*[\'"]([^\'"]*)[\'"]', content)
-    for match in className_matches:
+    # 1. Match className = "class1 class2" (also covers this.modalEl.className = "...")
+    for match in _RE_CLASSNAME.findall(content):
         js_classes.update(match.split())
     
-    # 2. Match this.modalEl.className = "class1 class2"
-    obj_className_matches = re.findall(r'\.className\s*=\s*[\'"]([^\'"]*)[\'"]', content)
-    for match in obj_className_matches:
-        js_classes.update(match.split())
-    
-    # 3. Match template strings with class="${var} class1 class2"
-    template_class_matches = re.findall(r'class=[\'"](.*?)[\'"]', content)
-    for match in template_class_matches:
+    # 2. Match class="${var} class1 class2" in HTML and in JS template literals - one pass
+    #    over the whole file covers both, so template literals are not scanned separately
+    for match in _RE_CLASS_ATTR.findall(content):
         # Skip if it contains ${...} template expressions
-        plain_parts = re.sub(r'\${.*?}', '', match).strip()
+        plain_parts = _RE_TEMPLATE_EXPR.sub('', match).strip()
         if plain_parts:
             js_classes.update(plain_parts.split())
     
-    # 4. Match .classList.add("class1") or classList.toggle("class1")
-    classList_matches = re.findall(r'\.classList\.(add|toggle|replace)\([\'"]([^\'"]+)[\'"]', content)
-    for _, class_name in classList_matches:
-        js_classes.add(class_name)
-    
-    # 5. Process HTML within JS template literals
-    # Find template literals with HTML content
-    template_literals = re.findall(r'`(.*?)`', content, re.DOTALL)
-    for template in template_literals:
-        if '<' in template and '>' in template:  # Simple check if it might contain HTML
-            # Find class attributes in the HTML-like content
-            html_classes = re.findall(r'class=[\'"]([^\'"]*)[\'"]', template)
-            for match in html_classes:
-                # Remove template expressions ${...} and split by whitespace
-                clean_match = re.sub(r'\${[^}]*}', '', match).strip()
-                if clean_match:
-                    js_classes.update(clean_match.split())
-    
-    # 6. Look for element creation with className assignment (your specific case)
-    element_classname_matches = re.findall(r'createElement\(.*?\);\s*.*?\.className\s*=\s*[\'"]([^\'"]*)[\'"]', content, re.DOTALL)
-    for match in element_classname_matches:
+    # 3. Match .classList.add("class1") or classList.toggle("class1")
+    js_classes.update(_RE_CLASSLIST.findall(content))
+    
+    # 4. Look for element creation with className assignment (your specific case)
+    for match in _RE_ELEMENT_CLASSNAME.findall(content):
         js_classes.update(match.split())
     
-    # 7. Look for any variable assignment with className value
-    var_classname_matches = re.findall(r'(?:var|let|const)\s+\w+\s*=\s*[\'"]([^\'"]*)[\'"];\s*.*?\.className', content)
-    for match in var_classname_matches:
+    # 5. Look for any variable assignment with className value
+    for match in _RE_VAR_CLASSNAME.findall(content):
         js_classes.update(match.split())
     
-    # 8. Expanded createElement pattern
-    create_el_matches = re.findall(r'createElement\([\'"][a-zA-Z0-9]+[\'"]\)[^;]*?className\s*=\s*[\'"]([^\'"]*)[\'"]', content)
-    for match in create_el_matches:
+    # 6. Expanded createElement pattern
+    for match in _RE_CREATE_EL_CLASSNAME.findall(content):
         js_classes.update(match.split())
         
-    # 9. Direct string assignments that look like class names
-    class_var_assignments = re.findall(r'[\'"]([a-zA-Z0-9_-]+(?:-[a-zA-Z0-9_-]+)*)[\'"]', content)
-    for potential_class in class_var_assignments:
+    # 7. Direct string assignments that look like class names
+    for potential_class in _RE_QUOTED_IDENT.findall(content):
         # Check if it matches typical CSS class naming pattern (kebab-case)
-        if re.match(r'^[a-zA-Z0-9]+-[a-zA-Z0-9-]+$', potential_class):
+        if _RE_KEBAB_CASE.match(potential_class):
             js_classes.add(potential_class)
     
     # For HTML files with class="..."
+    # (pass 2 already has the strictly quoted form; this adds the looser HTML syntax)
     if file_path.endswith(('.html', '.htm')):
-        try:
-            soup = BeautifulSoup(content, 'html.parser')
-            for tag in soup.find_all(attrs={"class": True}):
-                if isinstance(tag['class'], list):
-                    js_classes.update(tag['class'])
-                else:
-                    js_classes.update(tag['class'].split())
-        except Exception as e:
-            print(f"Error parsing HTML in {file_path}: {e}")
+        for match in _RE_HTML_CLASS_ATTR.finditer(content):
+            js_classes.update(next(value for value in match.groups() if value is not None).split())
     
     return js_classes
 
-def debug_extract_from_file(file_path, sample_size=5):
-    """Debug function to extract and print classes from a specific file"""
+@cached_extraction('tokens')
+def extract_class_tokens(file_path):
+    """Return every class-name-shaped token in a file.
+    
+    Intersecting these with the known CSS class names finds each class wherever it
+    appears at an identifier boundary, in one linear scan of the file.
+    """
+    # Scan raw bytes - class names are ASCII, so nothing is lost by skipping the decode.
+    # Large bundles are mapped rather than copied into memory.
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                tokens = set(_RE_CLASS_TOKEN.findall(content))
+        else:
+            tokens = set(_RE_CLASS_TOKEN.findall(f.read()))
+    
+    return {token.decode('ascii') for token in tokens}
+
+def collect_class_tokens(file_path):
+    """Worker entry point: return (file_path, tokens, error) for one HTML/JS file"""
+    try:
+        return file_path, extract_class_tokens(file_path), None
+    except Exception as e:
+        return file_path, set(), e
+
+def debug_extract_from_file(file_path, class_names, sample_size=5):
+    """Debug function to print the known classes a specific file is counted as using"""
     print(f"\nDebugging class extraction from: {file_path}")
     
     with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -388,158 +580,171 @@ def debug_extract_from_file(file_path, sample_size=5):
     for i, line in enumerate(lines):
         print(f"{i+1}: {line[:100]}{'...' if len(line) > 100 else ''}")
     
-    # Extract classes using our function
-    classes = extract_classes_from_html_js(file_path)
+    # The same tokens-and-known-names intersection that process_files counts
+    classes = extract_class_tokens(file_path).intersection(class_names)
     
-    print(f"Extracted {len(classes)} classes:")
+    print(f"Extracted {len(classes)} known classes:")
     print(", ".join(sorted(classes)))
     return classes
 
-def classify_risk(declarations):
-    """Classify the risk level of a set of declarations"""
-    for decl in declarations:
-        prop = decl.split(':')[0].strip()
-        if prop in HIGH_RISK_PROPS or any(prop.startswith(p+'-') for p in HIGH_RISK_PROPS):
-            return "HIGH"
-        if prop in MED_RISK_PROPS or any(prop.startswith(p+'-') for p in MED_RISK_PROPS):
-            return "MEDIUM"
+def classify_risk(properties):
+    """Classify the risk level of a rule from the set of property names it declares"""
+    if (not HIGH_RISK_PROPS.isdisjoint(properties)
+            or any(prop.startswith(_HIGH_RISK_PREFIXES) for prop in properties)):
+        return "HIGH"
+    if (not MED_RISK_PROPS.isdisjoint(properties)
+            or any(prop.startswith(_MED_RISK_PREFIXES) for prop in properties)):
+        return "MEDIUM"
     return "LOW"
 
-def guess_component(class_name, selectors):
-    """Guess which component the class belongs to based on name and selectors"""
-    # First try direct matches from component map
-    for key, component in COMPONENT_MAP.items():
-        if key == class_name.lower():
+# Specific modal types, checked in order against class names containing "modal"
+MODAL_TYPES = (
+    'account', 'accounts', 'user', 'users', 'project', 'projects', 
+    'document', 'documents', 'error', 'message', 'login', 'register',
+    'password', 'corpus', 'choose-content', 'text-prompt', 'yesno', 
+    'import', 'jobs', 'history'
+)
+
+# Modal types whose component name is not simply <Type>Modal
+MODAL_TYPE_OVERRIDES = {
+    'choose-content': 'ChooseContentForAIModal',
+    'accounts': 'AccountsModal',
+    'users': 'UsersModal',
+    'projects': 'ProjectsModal',
+    'documents': 'DocumentsModal',
+    'yesno': 'YesNoModal',
+    'text-prompt': 'TextPromptModal',
+    'password': 'PasswordResetModal'
+}
+
+# Ordered (substring, component) rules - first match wins
+IMPORT_STEP_COMPONENTS = (
+    ('select-file', 'ImportStepSelectFile'),
+    ('map-columns', 'ImportStepMapColumns'),
+    ('preview', 'ImportStepPreview'),
+    ('confirm', 'ImportStepConfirm'),
+    ('results', 'ImportStepResults')
+)
+
+STAGE_FORM_COMPONENTS = (
+    ('rfp-answer-questions', 'StageFormRfpAnswerQuestions'),
+    ('rfp-initial-review', 'StageFormAnalysisLMInitialReview'),
+    ('rfp-question-import', 'StageFormRfpQuestionImport')
+)
+
+BUTTON_COMPONENTS = {
+    'btn-primary': 'PrimaryButton',
+    'btn-secondary': 'SecondaryButton',
+    'btn-danger': 'DangerButton',
+    'btn-negative': 'NegativeButton',
+    'btn-label': 'ButtonLabel'
+}
+
+# Common patterns by word
+COMPONENT_PATTERNS = (
+    ('grid', 'Grid'),
+    ('pane', 'Pane'),
+    ('tab', 'Tab'),
+    ('form', 'Form'),
+    ('stat', 'Stat'),
+    ('indicator', 'Indicator'),
+    ('dropdown', 'Dropdown'),
+    ('list', 'List'),
+    ('section', 'Section'),
+    ('container', 'Container'),
+    ('item', 'Item'),
+    ('header', 'Header'),
+    ('footer', 'Footer'),
+    ('panel', 'Panel'),
+    ('label', 'Label'),
+    ('message', 'Message'),
+    ('wizard', 'Wizard'),
+    ('loading', 'Loading'),
+    ('progress', 'Progress'),
+    ('overlay', 'Overlay'),
+    ('doc', 'Document'),
+    ('status', 'Status')
+)
+# Source path fragments for file-specific classes
+FILE_PATTERNS = (
+    ('modals/', 'Modal'),
+    ('stages/', 'Stage'),
+    ('components/docitemimport/', 'Import'),
+    ('framework/', 'Framework'),
+    ('top-bar/', 'TopBar'),
+    ('tabs/', 'Tab')
+)
+
+def _first_substring_match(name_lc, rules, default):
+    """Return the component of the first (substring, component) rule found in name_lc"""
+    for substring, component in rules:
+        if substring in name_lc:
             return component
+    return default
+
+@functools.lru_cache(maxsize=None)
+def _guess_component_by_name(class_name):
+    """Guess the component from the class name alone; None if the name gives no hint"""
+    name_lc = class_name.lower()
+    
+    # First try direct matches from component map
+    component = COMPONENT_MAP.get(name_lc)
+    if component:
+        return component
     
     # JavaScript component pattern matching for modal classes
-    if 'modal' in class_name.lower():
+    if 'modal' in name_lc:
         # Check for specific modal types
-        modal_types = [
-            'account', 'accounts', 'user', 'users', 'project', 'projects', 
-            'document', 'documents', 'error', 'message', 'login', 'register',
-            'password', 'corpus', 'choose-content', 'text-prompt', 'yesno', 
-            'import', 'jobs', 'history'
-        ]
-        for modal_type in modal_types:
-            if modal_type in class_name.lower():
-                modal_class = modal_type.capitalize() + 'Modal'
-                if modal_type == 'choose-content':
-                    return 'ChooseContentForAIModal'
-                if modal_type == 'accounts':
-                    return 'AccountsModal'
-                if modal_type == 'users':
-                    return 'UsersModal'
-                if modal_type == 'projects':
-                    return 'ProjectsModal'
-                if modal_type == 'documents':
-                    return 'DocumentsModal'
-                if modal_type == 'yesno':
-                    return 'YesNoModal'
-                if modal_type == 'text-prompt':
-                    return 'TextPromptModal'
-                if modal_type == 'password':
-                    return 'PasswordResetModal'
-                return modal_class
+        for modal_type in MODAL_TYPES:
+            if modal_type in name_lc:
+                return MODAL_TYPE_OVERRIDES.get(modal_type, modal_type.capitalize() + 'Modal')
         return 'Modal'
     
     # Import wizard step components
-    if 'import-step' in class_name.lower():
-        if 'select-file' in class_name.lower():
-            return 'ImportStepSelectFile'
-        if 'map-columns' in class_name.lower():
-            return 'ImportStepMapColumns'
-        if 'preview' in class_name.lower():
-            return 'ImportStepPreview'
-        if 'confirm' in class_name.lower():
-            return 'ImportStepConfirm'
-        if 'results' in class_name.lower():
-            return 'ImportStepResults'
-        return 'ImportStep'
+    if 'import-step' in name_lc:
+        return _first_substring_match(name_lc, IMPORT_STEP_COMPONENTS, 'ImportStep')
         
     # Stage components
-    if 'stage-form' in class_name.lower():
-        if 'rfp-answer-questions' in class_name.lower():
-            return 'StageFormRfpAnswerQuestions'
-        if 'rfp-initial-review' in class_name.lower():
-            return 'StageFormAnalysisLMInitialReview'
-        if 'rfp-question-import' in class_name.lower():
-            return 'StageFormRfpQuestionImport'
-        return 'StageForm'
+    if 'stage-form' in name_lc:
+        return _first_substring_match(name_lc, STAGE_FORM_COMPONENTS, 'StageForm')
     
     # Button patterns
     if class_name.startswith('btn'):
-        if class_name == 'btn-primary':
-            return 'PrimaryButton'
-        if class_name == 'btn-secondary':
-            return 'SecondaryButton'
-        if class_name == 'btn-danger': 
-            return 'DangerButton'
-        if class_name == 'btn-negative':
-            return 'NegativeButton'
-        if class_name == 'btn-label':
-            return 'ButtonLabel'
-        return 'Button'
+        return BUTTON_COMPONENTS.get(class_name, 'Button')
     
     # Try broader substring matches
     for key, component in COMPONENT_MAP.items():
-        if key in class_name.lower():
+        if key in name_lc:
             return component
     
-    # Common patterns by word
-    patterns = {
-        'grid': 'Grid',
-        'pane': 'Pane',
-        'tab': 'Tab',
-        'form': 'Form',
-        'stat': 'Stat',
-        'indicator': 'Indicator',
-        'dropdown': 'Dropdown',
-        'list': 'List',
-        'section': 'Section',
-        'container': 'Container',
-        'item': 'Item',
-        'header': 'Header',
-        'footer': 'Footer',
-        'panel': 'Panel',
-        'label': 'Label',
-        'message': 'Message',
-        'wizard': 'Wizard',
-        'loading': 'Loading',
-        'progress': 'Progress',
-        'overlay': 'Overlay',
-        'doc': 'Document',
-        'status': 'Status'
-    }
-    
-    for pattern, component_type in patterns.items():
-        if pattern in class_name.lower():
-            # Create a camelCase component name based on the class name
-            words = class_name.replace('-', ' ').split()
-            if len(words) > 1:
-                # Convert to CamelCase
-                component_name = ''.join(word.capitalize() for word in words)
-                return component_name
-            return class_name.capitalize() + component_type
+    # Common patterns by word - one scan gives both the hit and its component
+    component_type = _first_substring_match(name_lc, COMPONENT_PATTERNS, None)
+    if component_type is not None:
+        # Create a camelCase component name based on the class name
+        words = class_name.replace('-', ' ').split()
+        if len(words) > 1:
+            # Convert to CamelCase
+            return ''.join(word.capitalize() for word in words)
+        return class_name.capitalize() + component_type
+    
+    return None
+
+def guess_component(class_name, selectors):
+    """Guess which component the class belongs to based on name and selectors"""
+    component = _guess_component_by_name(class_name)
+    if component is not None:
+        return component
     
     # Try to guess from selectors
     for selector in selectors:
+        selector_lc = selector.lower()
         for key, component in COMPONENT_MAP.items():
-            if key in selector.lower():
+            if key in selector_lc:
                 return component
     
     # Check if this is a file-specific class
-    file_patterns = {
-        'modals/': 'Modal',
-        'stages/': 'Stage',
-        'components/docitemimport/': 'Import',
-        'framework/': 'Framework',
-        'top-bar/': 'TopBar',
-        'tabs/': 'Tab'
-    }
-    
     for selector in selectors:
-        for file_pattern, component_type in file_patterns.items():
+        for file_pattern, component_type in FILE_PATTERNS:
             if file_pattern in selector:
                 return component_type
     
@@ -547,106 +752,131 @@ def guess_component(class_name, selectors):
 
 def hash_declarations(declarations):
     """Create a hash of declarations for detecting duplicates"""
-    sorted_decls = sorted(list(declarations))
-    return hashlib.md5(''.join(sorted_decls).encode()).hexdigest()
+    # NUL separator so e.g. {'a: 1', 'b: 2'} and {'a: 1b: 2'} cannot collide
+    return _fingerprint('\0'.join(sorted(declarations)).encode())
 
 def find_duplicate_rules(class_map):
     """Find duplicate rule sets with different class names"""
     hash_to_classes = defaultdict(list)
     
+    # Duplicated declaration sets are the common case here, so hash each distinct set once
+    hash_cache = {}
     for class_name, data in class_map.items():
-        hash_value = hash_declarations(data['declarations'])
+        declarations = frozenset(data['declarations'])
+        hash_value = hash_cache.get(declarations)
+        if hash_value is None:
+            hash_value = hash_cache[declarations] = hash_declarations(declarations)
         hash_to_classes[hash_value].append(class_name)
     
     # Return only duplicates (more than one class with same declarations)
     return {hash_val: classes for hash_val, classes in hash_to_classes.items() if len(classes) > 1}
 
-def main():
-    parser = argparse.ArgumentParser(description='CSS Audit Tool for Respond SPA')
-    parser.add_argument('--css', nargs='+', help='CSS files to analyze')
-    parser.add_argument('--html', nargs='+', help='HTML/JS files pattern to analyze')
-    parser.add_argument('--output', default='css-audit/output', help='Output directory')
-    args = parser.parse_args()
-    
-    # Ensure output directory exists
-    os.makedirs(args.output, exist_ok=True)
-    
+def iter_html_js_files(patterns):
+    """Lazily expand glob patterns like /path/**/*.js into matching file paths"""
+    for pattern in patterns:
+        # Remove quotes if they exist
+        pattern = pattern.strip("'\"")
+        yield from glob.iglob(pattern, recursive=True)
+
+def process_files(executor, css_files, html_patterns):
+    """Build the class map from the CSS files and count usages across the HTML/JS files"""
     # Process CSS files
     class_map = {}
-    for css_file in args.css:
-        file_class_map = extract_classes_from_css(css_file)
+    for file_class_map in executor.map(extract_classes_from_css, css_files, chunksize=4):
         for class_name, data in file_class_map.items():
-            if class_name in class_map:
-                class_map[class_name]['declarations'].update(data['declarations'])
-                class_map[class_name]['files'].update(data['files'])
-                class_map[class_name]['selectors'].update(data['selectors'])
-            else:
+            entry = class_map.get(class_name)
+            if entry is None:
+                # Worker results arrive as fresh copies - re-intern in this process
+                data['declarations'] = intern_declarations(data['declarations'])
                 class_map[class_name] = data
-    
-    # Process HTML/JS files for usage counting
-    # Use glob to expand patterns like /path/**/*.js
-    processed_files = []
-    for pattern in args.html:
-        # Remove quotes if they exist
-        pattern = pattern.strip("'\"")
-        # Expand the glob pattern to get actual files
-        matching_files = glob.glob(pattern, recursive=True)
-        processed_files.extend(matching_files)
-        
-    # After processing all files
-    if not processed_files:
-        print("WARNING: No HTML/JS files were found matching the patterns. Check your paths.")
-    else:
-        print(f"Found {len(processed_files)} HTML/JS files to process")
-        
-        # Debug the first few files to verify class extraction
-        sample_files = processed_files[:3]  # Show first 3 files
+            else:
+                entry['declarations'] = intern_declarations(entry['declarations'] | data['declarations'])
+                entry['properties'] = entry['properties'] | data['properties']
+                entry['files'].update(data['files'])
+                entry['selectors'].update(data['selectors'])
+    
+    # Process HTML/JS files for usage counting (paths are streamed to the workers
+    # as the glob walk produces them)
+    html_files = iter_html_js_files(html_patterns)
+    
+    # Debug the first few files to verify class extraction
+    sample_files = list(itertools.islice(html_files, 3))  # Show first 3 files
+    if sample_files:
         all_found_classes = set()
         
         for sample_file in sample_files:
-            found_classes = debug_extract_from_file(sample_file)
+            found_classes = debug_extract_from_file(sample_file, class_map)
             all_found_classes.update(found_classes)
         
         print(f"\nTotal unique classes found in sample files: {len(all_found_classes)}")
         print(f"Sample of found classes: {', '.join(sorted(list(all_found_classes)[:20]))}")
     
-    print(f"Found {len(processed_files)} HTML/JS files to process")
+    processed_count = 0
+    # Count a file as using a class when the class name appears in it as a whole token
+    for file_path, tokens, error in executor.map(collect_class_tokens,
+                                                 itertools.chain(sample_files, html_files),
+                                                 chunksize=32):
+        processed_count += 1
+        if error is not None:
+            print(f"Error processing file {file_path}: {error}")
+            continue
+        for class_name in tokens.intersection(class_map):
+            class_map[class_name]['count'] += 1
+    
+    if not processed_count:
+        print("WARNING: No HTML/JS files were found matching the patterns. Check your paths.")
+    else:
+        print(f"Processed {processed_count} HTML/JS files")
+    
+    return class_map
+
+def main():
+    parser = argparse.ArgumentParser(description='CSS Audit Tool for Respond SPA')
+    parser.add_argument('--css', nargs='+', help='CSS files to analyze')
+    parser.add_argument('--html', nargs='+', help='HTML/JS files pattern to analyze')
+    parser.add_argument('--output', default='css-audit/output', help='Output directory')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-parse every file instead of reusing cached results from previous runs')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    
+    # Ensure output directory exists
+    os.makedirs(args.output, exist_ok=True)
+    
+    # Reuse extraction results for files unchanged since the last run
+    if not args.no_cache:
+        init_cache(os.path.join(args.output, '.cache'))
+    
+    # Files are parsed independently, so spread the work across processes
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker,
+                             initargs=(_CACHE_DIR,)) as executor:
+        class_map = process_files(executor, args.css, args.html)
     
-    for file_path in processed_files:
-        try:
-            used_classes = extract_classes_from_html_js(file_path)
-            for class_name in used_classes:
-                if class_name in class_map:
-                    class_map[class_name]['count'] += 1
-        except Exception as e:
-            print(f"Error processing file {file_path}: {e}")
+    # Find duplicates (while declarations are still interned frozensets)
+    duplicates = find_duplicate_rules(class_map)
     
     # Add risk classification and component guessing
     for class_name, data in class_map.items():
-        data['risk'] = classify_risk(data['declarations'])
+        # Property names are only needed for classification, not in the report
+        data['risk'] = classify_risk(data.pop('properties'))
         data['component'] = guess_component(class_name, data['selectors'])
         # Convert sets to lists for JSON serialization
         data['files'] = list(data['files'])
         data['declarations'] = list(data['declarations'])
         data['selectors'] = list(data['selectors'])
     
-    # Find duplicates
-    duplicates = find_duplicate_rules(class_map)
-    
-    # Convert to serializable format for duplicates
-    serializable_duplicates = {k: v for k, v in duplicates.items()}
-    
     # Save the full audit data
-    with open(f"{args.output}/css-audit-full.json", 'w') as f:
-        json.dump(class_map, f, indent=2)
+    write_json(f"{args.output}/css-audit-full.json", class_map)
     
     # Save duplicates separately
-    with open(f"{args.output}/css-duplicates.json", 'w') as f:
-        json.dump(serializable_duplicates, f, indent=2)
+    write_json(f"{args.output}/css-duplicates.json", duplicates)
     
-    # Create CSV for easy viewing
+    # Create CSV for easy viewing (tallying the risk breakdown in the same pass)
     csv_data = []
+    risk_counts = Counter()
     for class_name, data in class_map.items():
+        risk_counts[data['risk']] += 1
         row = {
             'class': class_name,
             'risk': data['risk'],
@@ -666,17 +896,18 @@ def main():
         csv_data.append(row)
     
     # Write to CSV sorted by usage count descending
-    df = pd.DataFrame(csv_data)
-    df = df.sort_values('usage_count', ascending=False)
-    df.to_csv(f"{args.output}/css-audit.csv", index=False)
+    csv_data.sort(key=itemgetter('usage_count'), reverse=True)
+    with open(f"{args.output}/css-audit.csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(csv_data)
     
     # Print summary
     print(f"CSS Audit Complete!")
     print(f"Found {len(class_map)} unique CSS classes across {len(args.css)} CSS files")
     print(f"Identified {sum(1 for _, classes in duplicates.items() if len(classes) > 1)} duplicate rule sets")
     print(f"Risk breakdown:")
-    risk_counts = df['risk'].value_counts()
-    for risk, count in risk_counts.items():
+    for risk, count in risk_counts.most_common():
         print(f"  {risk}: {count} classes")
     print(f"Output saved to {args.output}/")
 
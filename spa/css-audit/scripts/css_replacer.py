@@ -10,86 +10,86 @@ import os
 import re
 import json
 import argparse
-from bs4 import BeautifulSoup, Comment
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Files are matched and rewritten as bytes, so these are bytes patterns
+
+# class="..." / class='...' attributes in HTML (not data-class, etc.)
+CLASS_ATTR_RE = re.compile(
+    rb'(?P<prefix>(?<![\w:-])class\s*=\s*(?P<quote>[\'"]))(?P<classes>.*?)(?P=quote)',
+    re.IGNORECASE | re.DOTALL
+)
+
+# className patterns in JS/JSX/TS/TSX; group 1 is the class string
+JS_CLASSNAME_PATTERNS = [
+    re.compile(rb'className=[\'"]([^\'"]*)[\'"]'),  # className="..."
+    re.compile(rb'className={[\'"]([^\'"]*)[\'"]}')  # className={"..."}
+]
 
 def load_class_mapping(mapping_file):
     """Load class name mapping from JSON file"""
     with open(mapping_file, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def replace_class_in_html(file_path, class_mapping):
-    """Replace class names in HTML file"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    changes_made = False
+def encode_mapping(class_mapping):
+    """Class mapping with UTF-8 encoded keys and values, for matching raw file bytes"""
+    return {old.encode('utf-8'): new.encode('utf-8') for old, new in class_mapping.items()}
+
+def replace_class_in_html(content, class_mapping):
+    """Replace class names in HTML content (bytes)"""
+    # Bound once - looked up for every class token in the file
+    lookup = encode_mapping(class_mapping).get
     
-    # Process elements with class attributes
-    for tag in soup.find_all(class_=True):
-        original_classes = set(tag['class'])
-        new_classes = set()
-        
-        for cls in original_classes:
-            if cls in class_mapping:
-                new_classes.add(class_mapping[cls])
-                changes_made = True
-            else:
-                new_classes.add(cls)
-        
-        if changes_made:
-            tag['class'] = list(new_classes)
+    def remap(match):
+        # A list walk keeps the tokens' order and any duplicates as written
+        classes = match.group('classes').split()
+        new_classes = [lookup(cls, cls) for cls in classes]
+        if new_classes == classes:
+            return match.group(0)
+        # Rewrite only the attribute value, keeping the original quoting
+        return match.group('prefix') + b' '.join(new_classes) + match.group('quote')
     
-    if changes_made:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-            
-        return True
-    return False
+    return CLASS_ATTR_RE.sub(remap, content)
 
-def replace_class_in_js(file_path, class_mapping):
-    """Replace className values in JS/JSX/TS/TSX files"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+def replace_class_in_js(content, class_mapping):
+    """Replace className values in JS/JSX/TS/TSX content (bytes)"""
+    # Bound once - looked up for every class token in the file
+    lookup = encode_mapping(class_mapping).get
     
-    changes_made = False
-    new_content = content
+    def remap(match):
+        classes = match.group(1).split()
+        new_classes = [lookup(cls, cls) for cls in classes]
+        if new_classes == classes:
+            return match.group(0)
+        # Splice the new class string into the matched text, leaving the quotes/braces as-is
+        whole = match.group(0)
+        value_start = match.start(1) - match.start()
+        value_end = match.end(1) - match.start()
+        return whole[:value_start] + b' '.join(new_classes) + whole[value_end:]
     
-    # Find className patterns
-    className_patterns = [
-        r'className=[\'"]([^\'"]*)[\'"]',  # className="..."
-        r'className={[\'"]([^\'"]*)[\'"]}'  # className={"..."}
-    ]
-    
-    for pattern in className_patterns:
-        matches = re.findall(pattern, content)
-        
-        for class_str in matches:
-            classes = class_str.split()
-            new_classes = []
-            class_changed = False
-            
-            for cls in classes:
-                if cls in class_mapping:
-                    new_classes.append(class_mapping[cls])
-                    class_changed = True
-                else:
-                    new_classes.append(cls)
-            
-            if class_changed:
-                new_class_str = ' '.join(new_classes)
-                # Replace only the exact class string to avoid partial matches
-                pattern_instance = pattern.replace('([^\'\"]*)', re.escape(class_str))
-                replacement = pattern.replace('([^\'\"]*)', new_class_str)
-                new_content = re.sub(pattern_instance, replacement, new_content)
-                changes_made = True
+    # One linear pass per pattern, rewriting each match in place
+    new_content = content
+    for pattern in JS_CLASSNAME_PATTERNS:
+        new_content = pattern.sub(remap, new_content)
+    return new_content
+
+def replace_classes_in_file(file_path, class_mapping):
+    """
+    New content for one HTML or JS file according to its extension, or None if
+    nothing changes. Only reads the file, so it can run in a pool worker
+    """
+    if file_path.endswith(('.html', '.htm')):
+        replace = replace_class_in_html
+    elif file_path.endswith(('.js', '.jsx', '.ts', '.tsx')):
+        replace = replace_class_in_js
+    else:
+        return None
     
-    if changes_made:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-            
-        return True
-    return False
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    new_content = replace(content, class_mapping)
+    return new_content if new_content != content else None
 
 def generate_deprecated_css(class_mapping, original_audit, output_file):
     """Generate a CSS file with deprecated class forwarding"""
@@ -97,27 +97,29 @@ def generate_deprecated_css(class_mapping, original_audit, output_file):
     with open(original_audit, 'r', encoding='utf-8') as f:
         audit_data = json.load(f)
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('/* Respond SPA Deprecated Classes - Auto-generated */\n')
-        f.write('/* This file maintains backward compatibility */\n\n')
+    # Build the whole file in memory and write it once - it is small
+    lines = [
+        '/* Respond SPA Deprecated Classes - Auto-generated */\n',
+        '/* This file maintains backward compatibility */\n\n'
+    ]
+    
+    for old_class, new_class in class_mapping.items():
+        # Get original declarations if available
+        declarations = audit_data.get(old_class, {}).get('declarations', [])
+        
+        lines.append(f'/* {old_class} → {new_class} */\n')
+        lines.append(f'.{old_class} {{\n')
+        
+        if declarations:
+            lines.extend(f'  {decl};\n' for decl in declarations)
+            lines.append('  /* Original declarations above, forwarding below */\n')
         
-        for old_class, new_class in class_mapping.items():
-            # Get original declarations if available
-            declarations = []
-            if old_class in audit_data:
-                declarations = audit_data[old_class].get('declarations', [])
-            
-            f.write(f'/* {old_class} → {new_class} */\n')
-            f.write(f'.{old_class} {{\n')
-            
-            if declarations:
-                for decl in declarations:
-                    f.write(f'  {decl};\n')
-                f.write('  /* Original declarations above, forwarding below */\n')
-            
-            # Add a comment noting this is a deprecated class
-            f.write(f'  /* @deprecated Use .{new_class} instead */\n')
-            f.write('}\n\n')
+        # Add a comment noting this is a deprecated class
+        lines.append(f'  /* @deprecated Use .{new_class} instead */\n')
+        lines.append('}\n\n')
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(''.join(lines))
 
 def main():
     parser = argparse.ArgumentParser(description='CSS Class Replacer for Respond SPA')
@@ -126,6 +128,8 @@ def main():
     parser.add_argument('--files', nargs='+', help='HTML/JS files to process')
     parser.add_argument('--deprecated-css', default='styles/deprecated-classes.css', 
                         help='Output file for deprecated classes')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
     args = parser.parse_args()
     
     # Ensure output directory exists
@@ -134,24 +138,32 @@ def main():
     # Load the class mapping
     class_mapping = load_class_mapping(args.mapping)
     
-    # Process each file
-    files_changed = 0
+    # Each file once, even if given twice under different paths; two workers
+    # on the same file would race, and a chained mapping would apply twice
+    files = []
+    seen_files = set()
     for file_path in args.files:
-        file_changed = False
-        
-        if file_path.endswith(('.html', '.htm')):
-            file_changed = replace_class_in_html(file_path, class_mapping)
-        elif file_path.endswith(('.js', '.jsx', '.ts', '.tsx')):
-            file_changed = replace_class_in_js(file_path, class_mapping)
-        
-        if file_changed:
-            files_changed += 1
+        real_path = os.path.realpath(file_path)
+        if real_path not in seen_files:
+            seen_files.add(real_path)
+            files.append(file_path)
+    
+    # Files are processed independently across processes; the parent does the writes
+    files_changed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = executor.map(partial(replace_classes_in_file, class_mapping=class_mapping),
+                               files, chunksize=16)
+        for file_path, new_content in zip(files, results):
+            if new_content is not None:
+                with open(file_path, 'wb') as f:
+                    f.write(new_content)
+                files_changed += 1
     
     # Generate deprecated CSS file for backward compatibility
     generate_deprecated_css(class_mapping, args.audit, args.deprecated_css)
     
     print(f"CSS class replacement complete!")
-    print(f"Modified {files_changed} out of {len(args.files)} files")
+    print(f"Modified {files_changed} out of {len(files)} files")
     print(f"Deprecated classes CSS file generated: {args.deprecated_css}")
 
 if __name__ == "__main__":
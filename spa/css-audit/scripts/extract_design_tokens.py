@@ -8,46 +8,74 @@ Creates a _tokens.css file with consolidated design tokens.
 
 import os
 import re
-import cssutils
+import mmap
 import argparse
 from collections import defaultdict
+from contextlib import contextmanager
 
-# Suppress cssutils parsing warnings
-cssutils.log.setLevel(40)  # ERROR level only
+# Extractors scan the raw file bytes; only captured values are decoded
+CSS_COMMENT_RE = re.compile(rb'/\*.*?\*/', re.DOTALL)
+
+# Typography declarations (not custom properties such as --font-size-base); the
+# terminator requirement keeps selectors like .line-height:hover from matching
+TYPOGRAPHY_RE = re.compile(
+    rb'(?<![\w-])(font-family|font-size|font-weight|line-height|letter-spacing)\s*:\s*([^;{}]+?)\s*(?=[;}])',
+    re.IGNORECASE
+)
+IMPORTANT_RE = re.compile(rb'\s*!\s*important$', re.IGNORECASE)
+
+# Hex colors, rgb/rgba, hsl/hsla
+HEX_COLOR_RE = re.compile(rb'#([0-9a-fA-F]{3,8})\b')
+FUNCTIONAL_COLOR_RES = [
+    re.compile(rb'rgba?\([^)]+\)'),
+    re.compile(rb'hsla?\([^)]+\)')
+]
+
+ROOT_BLOCK_RE = re.compile(rb':root\s*{([^}]+)}')
+VARIABLE_RE = re.compile(rb'(--[a-zA-Z0-9_-]+)\s*:\s*([^;]+);')
+
+# Base margin/padding declarations and their directional variants
+SPACING_RES = {
+    prop: (
+        re.compile(rb'%s\s*:\s*([^;]+);' % prop),
+        re.compile(rb'%s-(top|right|bottom|left|inline|block|inline-start|inline-end|block-start|block-end)\s*:\s*([^;]+);' % prop)
+    )
+    for prop in (b'margin', b'padding')
+}
+# Keep only px, rem, em units and var() references
+STANDARD_SPACING_RE = re.compile(r'^(\d+(\.\d+)?(px|rem|em)|var\([^)]+\))$')
+NUMBER_RE = re.compile(r'[\d.]+')
+
+@contextmanager
+def map_css_file(css_file):
+    """Yield the contents of a CSS file as a read-only mmap buffer"""
+    with open(css_file, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
 
 def extract_color_values(css_content):
     """Extract all color values from CSS content"""
-    # Look for hex colors, rgb/rgba, hsl/hsla
-    color_patterns = [
-        r'#([0-9a-fA-F]{3,8})\b',  # Hex colors
-        r'rgba?\([^)]+\)',  # RGB/RGBA
-        r'hsla?\([^)]+\)'   # HSL/HSLA
-    ]
-    
-    colors = set()
-    for pattern in color_patterns:
-        matches = re.findall(pattern, css_content)
-        if pattern.startswith('#'):
-            colors.update(f"#{m}" for m in matches)
-        else:
-            colors.update(matches)
+    colors = {f"#{m.decode('utf-8')}" for m in HEX_COLOR_RE.findall(css_content)}
+    for pattern in FUNCTIONAL_COLOR_RES:
+        colors.update(m.decode('utf-8') for m in pattern.findall(css_content))
     
     return colors
 
-def extract_css_variables(css_file):
-    """Extract CSS variables from a file"""
-    with open(css_file, 'r', encoding='utf-8') as f:
-        css_content = f.read()
-    
+def extract_css_variables(css_content):
+    """Extract CSS variables from CSS content"""
     # Find all :root declarations
-    root_blocks = re.findall(r':root\s*{([^}]+)}', css_content)
+    root_blocks = ROOT_BLOCK_RE.findall(css_content)
     
     variables = {}
     for block in root_blocks:
         # Extract variable declarations
-        var_matches = re.findall(r'(--[a-zA-Z0-9_-]+)\s*:\s*([^;]+);', block)
+        var_matches = VARIABLE_RE.findall(block)
         for var_name, var_value in var_matches:
-            variables[var_name] = var_value.strip()
+            variables[var_name.decode('utf-8')] = var_value.strip().decode('utf-8')
     
     return variables
 
@@ -61,48 +89,35 @@ def extract_typography_values(css_content):
         'letter-spacing': set()
     }
     
-    # Parse the CSS
-    stylesheet = cssutils.parseString(css_content)
+    # Comments can contain commented-out declarations - drop them first
+    css_content = CSS_COMMENT_RE.sub(b'', css_content)
     
-    for rule in stylesheet:
-        if rule.type == rule.STYLE_RULE:
-            style = rule.style
-            for prop in style:
-                if prop.name in typography:
-                    typography[prop.name].add(prop.value.strip())
+    for prop, value in TYPOGRAPHY_RE.findall(css_content):
+        value = IMPORTANT_RE.sub(b'', b' '.join(value.split()))
+        if value:
+            typography[prop.lower().decode('ascii')].add(value.decode('utf-8'))
     
     return typography
 
 def extract_spacing_values(css_content):
     """Extract spacing values (margin, padding)"""
-    spacing_props = ['margin', 'padding']
     spacing_values = set()
     
-    # Find values for margin/padding properties
-    for prop in spacing_props:
-        # Match both the property and directional variants
-        patterns = [
-            rf'{prop}\s*:\s*([^;]+);',
-            rf'{prop}-(top|right|bottom|left|inline|block|inline-start|inline-end|block-start|block-end)\s*:\s*([^;]+);'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, css_content)
-            if len(re.findall(r'-', pattern)) > 0:  # Directional properties
-                for match in matches:
-                    spacing_values.add(match[1].strip())
-            else:  # Base property
-                spacing_values.update(match.strip() for match in matches)
+    # Find values for margin/padding properties and their directional variants
+    for base_re, directional_re in SPACING_RES.values():
+        spacing_values.update(match.strip().decode('utf-8') for match in base_re.findall(css_content))
+        spacing_values.update(match[1].strip().decode('utf-8') for match in directional_re.findall(css_content))
     
     # Filter out non-standard values and variables
-    standard_values = set()
-    for value in spacing_values:
-        # Keep only px, rem, em units and var() references
-        if re.match(r'^(\d+(\.\d+)?(px|rem|em)|var\([^)]+\))$', value):
-            standard_values.add(value)
+    standard_values = {value for value in spacing_values if STANDARD_SPACING_RE.match(value)}
     
     return standard_values
 
+def spacing_sort_key(value):
+    """Sort spacing values by their leading number"""
+    number = NUMBER_RE.search(value)
+    return float(number.group()) if number else 0
+
 def generate_token_file(variables, colors, typography, spacing, output_file):
     """Generate a CSS design token file"""
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -142,7 +157,7 @@ def generate_token_file(variables, colors, typography, spacing, output_file):
         if spacing:
             f.write('/* Spacing Tokens */\n:root {\n')
             spacing_map = {}
-            for i, value in enumerate(sorted(spacing, key=lambda x: float(re.findall(r'[\d.]+', x)[0]) if re.findall(r'[\d.]+', x) else 0)):
+            for i, value in enumerate(sorted(spacing, key=spacing_sort_key)):
                 if 'var' not in value:  # Skip variables
                     var_name = f'--space-{i}'
                     spacing_map[value] = var_name
@@ -176,28 +191,35 @@ def main():
     }
     all_spacing = set()
     
+    # The same stylesheet can be named more than once (overlapping globs,
+    # relative vs absolute paths); read each underlying file only once
+    seen_files = set()
+    
     # Process each CSS file
     for css_file in args.css:
-        # Extract variables
-        variables = extract_css_variables(css_file)
-        all_variables.update(variables)
-        
-        # Read file content for other extractions
-        with open(css_file, 'r', encoding='utf-8') as f:
-            css_content = f.read()
+        real_path = os.path.realpath(css_file)
+        if real_path in seen_files:
+            continue
+        seen_files.add(real_path)
         
-        # Extract colors
-        colors = extract_color_values(css_content)
-        all_colors.update(colors)
-        
-        # Extract typography
-        typography = extract_typography_values(css_content)
-        for prop, values in typography.items():
-            all_typography[prop].update(values)
-        
-        # Extract spacing
-        spacing = extract_spacing_values(css_content)
-        all_spacing.update(spacing)
+        # Map the file once and hand the same buffer to every extractor
+        with map_css_file(css_file) as css_content:
+            # Extract variables
+            variables = extract_css_variables(css_content)
+            all_variables.update(variables)
+            
+            # Extract colors
+            colors = extract_color_values(css_content)
+            all_colors.update(colors)
+            
+            # Extract typography
+            typography = extract_typography_values(css_content)
+            for prop, values in typography.items():
+                all_typography[prop].update(values)
+            
+            # Extract spacing
+            spacing = extract_spacing_values(css_content)
+            all_spacing.update(spacing)
     
     # Generate the token file
     generate_token_file(all_variables, all_colors, all_typography, all_spacing, args.output)
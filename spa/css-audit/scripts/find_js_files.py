@@ -4,9 +4,21 @@ Script to find all JS files in the web2 project directory structure
 """
 
 import os
-import glob
 import argparse
 
+# Directories that never contain project sources
+SKIP_DIRS = {'node_modules'}
+
+def walk_files(root, exts=('.js', '.html')):
+    """Yield files under root with one of the given suffixes in a single walk"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Prune in place so os.walk never descends into them; hidden entries are
+        # skipped the same way glob's ** does
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.')]
+        for filename in filenames:
+            if filename.endswith(exts) and not filename.startswith('.'):
+                yield os.path.join(dirpath, filename)
+
 def main():
     parser = argparse.ArgumentParser(description='Find all JS/HTML files in the project')
     parser.add_argument('--base-dir', required=True, help='Project base directory')
@@ -26,8 +38,10 @@ def main():
     # Find all JS and HTML files in each directory
     for directory in search_dirs:
         if os.path.exists(directory):
-            js_files = glob.glob(os.path.join(directory, '**', '*.js'), recursive=True)
-            html_files = glob.glob(os.path.join(directory, '**', '*.html'), recursive=True)
+            js_files = []
+            html_files = []
+            for path in walk_files(directory):
+                (js_files if path.endswith('.js') else html_files).append(path)
             all_files.extend(js_files)
             all_files.extend(html_files)
             print(f"Found {len(js_files)} JS and {len(html_files)} HTML files in {directory}")
@@ -36,20 +50,15 @@ def main():
     print(f"\nTotal: {len(all_files)} files found")
     
     # Print command to use
-    command = "python css-audit/scripts/css_audit.py --css styles/styles.css styles/tabs.css styles/modal.css styles/menu.css styles/document.css styles/analysis-lm.css"
-    
-    # Add files to command (split into manageable chunks)
-    chunk_size = 20
-    chunks = [all_files[i:i+chunk_size] for i in range(0, len(all_files), chunk_size)]
+    parts = ["python css-audit/scripts/css_audit.py --css styles/styles.css styles/tabs.css styles/modal.css styles/menu.css styles/document.css styles/analysis-lm.css"]
     
-    for i, chunk in enumerate(chunks):
-        file_args = " ".join([f'"{f}"' for f in chunk])
-        if i == 0:
-            command += f" --html {file_args}"
-        else:
-            command = f"{command} {file_args}"
+    # Collect the pieces and join once rather than growing the string in place
+    if all_files:
+        parts.append("--html")
+        parts.extend(f'"{f}"' for f in all_files)
     
-    command += " --output css-audit/output"
+    parts.append("--output css-audit/output")
+    command = " ".join(parts)
     
     # Split and print command in chunks for easier copying
     print("\nCommand to use (in chunks for easier copying):")
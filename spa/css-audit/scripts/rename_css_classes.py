@@ -20,31 +20,45 @@ Non-interactive batch (CI):
 """
 
 import argparse
+import bisect
+import io
 import json
+import os
 import pathlib
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from functools import lru_cache, partial
 from shutil import copy2
 
-# For single-key input without Enter
+# For single-key input without Enter; getch() expects to run inside raw_tty()
 try:
-    # Windows
+    # Windows - msvcrt already reads single keys
     import msvcrt
+    raw_tty = nullcontext
     def getch():
         return msvcrt.getch().decode()
 except ImportError:
     # Unix-like
     import termios
     import tty
-    def getch():
+    @contextmanager
+    def raw_tty():
+        """Switch the terminal to unbuffered key input once for a whole run of prompts"""
+        if not sys.stdin.isatty():
+            yield
+            return
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
         try:
-            tty.setraw(fd)
-            ch = sys.stdin.read(1)
+            # cbreak rather than raw keeps output newlines and Ctrl-C working
+            tty.setcbreak(fd)
+            yield
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-        return ch
+    def getch():
+        return sys.stdin.read(1)
 
 ANSI_YELLOW = "\033[33m"
 ANSI_GREEN = "\033[32m"
@@ -54,6 +68,67 @@ ANSI_RESET = "\033[0m"
 JS_FILE_GLOB = ["*.js", "*.jsx", "*.ts", "*.tsx"]
 
 
+# Patterns that specifically target CSS class references; {CLASS} is replaced
+# with the escaped class name
+PATTERN_TEMPLATES = [
+    # class="..." or className="..." in JSX/HTML with word boundaries
+    (r'(class|className)\s*=\s*[\'"](?:[^\'"]*\s+)?\b({CLASS})\b(?:\s+[^\'"]*)?[\'"]', 'JSX attribute'),
+    
+    # class={...} or className={...} in JSX with template literals
+    (r'(class|className)\s*=\s*\{\s*[\'"`](?:[^\'"]*\s+)?\b({CLASS})\b(?:\s+[^\'"]*)?[\'"`]', 'JSX expression'),
+    
+    # classList.add/remove/toggle/contains/replace("...") with word boundaries
+    (r'classList\.(add|remove|toggle|contains|replace)\(\s*[\'"](?:[^\'"]*\s+)?\b({CLASS})\b(?:\s+[^\'"]*)?[\'"]', 'classList method'),
+    
+    # querySelector/querySelectorAll with class selector
+    (r'querySelector(?:All)?\(\s*[\'"]\.({CLASS})[\'"\s)]', 'querySelector'),
+    
+    # getElementsByClassName direct match
+    (r'getElementsByClassName\(\s*[\'"]({CLASS})[\'"]', 'getElementsByClassName'),
+    
+    # Direct string assignments that look like they're for class names
+    (r'(?:className|cssClass|klass|cls)\s*=\s*[\'"](?:[^\'"]*\s+)?\b({CLASS})\b(?:\s+[^\'"]*)?[\'"]', 'class assignment'),
+    
+    # matchesSelector and closest methods
+    (r'(?:matchesSelector|matches|closest)\(\s*[\'"]\.({CLASS})[\'"\s)]', 'matches method'),
+    
+    # Element creation with class direct assignment
+    (r'\.className\s*=\s*[\'"](?:[^\'"]*\s+)?\b({CLASS})\b(?:\s+[^\'"]*)?[\'"]', 'className property'),
+    
+    # String literals for class name in common operations
+    (r'[\'"]\.({CLASS})[\'"]', 'class selector string'),
+]
+
+
+# Match types whose quoted value may hold several space-separated class names
+MULTI_CLASS_TYPES = frozenset({
+    'JSX attribute', 'JSX expression', 'classList method', 'class assignment', 'className property'
+})
+
+def class_alternation(class_names: tuple[str, ...]) -> str:
+    """Regex alternation of the class names, longest first so btn--primary beats btn"""
+    return "|".join(re.escape(name) for name in sorted(class_names, key=len, reverse=True))
+
+
+@lru_cache(maxsize=256)
+def compiled_patterns(class_names: tuple[str, ...]) -> tuple[list[tuple[re.Pattern, str]], re.Pattern]:
+    """
+    Compile PATTERN_TEMPLATES once for the whole mapping, with every class name
+    fused into a single alternation, plus a word pattern for picking the
+    individual names out of a matched class list.
+
+    The templates stay separate patterns: their matches can overlap (an
+    expression's tail may run on into the next attribute), which one combined
+    finditer would never report.
+    """
+    # Compiled as bytes patterns - files are scanned without decoding them
+    alternation = class_alternation(class_names).encode("utf-8")
+    patterns = [(re.compile(template.encode("utf-8").replace(b"{CLASS}", alternation)), match_type)
+                for template, match_type in PATTERN_TEMPLATES]
+    # Names in a class list are delimited by whitespace or the enclosing quotes
+    return patterns, re.compile(rb'(?<![^\s\'"`])(' + alternation + rb')(?![^\s\'"`])')
+
+
 def load_mapping(args: argparse.Namespace) -> dict[str, str]:
     mapping: dict[str, str] = {}
     if args.map:
@@ -83,135 +158,182 @@ def prompt(question: str) -> str:
             return key
 
 
-def find_class_references(content: str, class_name: str) -> list[tuple]:
+@lru_cache(maxsize=None)
+def class_name_screen(class_names: tuple[str, ...]) -> re.Pattern:
+    """Bytes pattern matching any class name literally, used to skip files without decoding them"""
+    return re.compile(b"|".join(re.escape(name.encode("utf-8")) for name in class_names))
+
+
+def find_class_references(content: bytes, class_names: tuple[str, ...]) -> list[tuple]:
     """
-    Find precise references to CSS class names in JavaScript/JSX.
-    Returns a list of (start, end, match_type, context) tuples.
+    Find precise references to any of the given CSS class names in JavaScript/JSX.
+    Returns a list of (start, end, class_name, match_type, context) tuples, with
+    byte offsets into content, in file order. Each span is reported once, under
+    the first pattern that matched it.
     """
     results = []
+    seen = set()
+    patterns, class_word = compiled_patterns(class_names)
     
-    # Define patterns that specifically target CSS class references
-    patterns = [
-        # class="..." or className="..." in JSX/HTML with word boundaries
-        (r'(class|className)\s*=\s*[\'"](?:[^\'"]*\s+)?' + r'\b(' + re.escape(class_name) + r')\b' + r'(?:\s+[^\'"]*)?[\'"]', 'JSX attribute'),
-        
-        # class={...} or className={...} in JSX with template literals
-        (r'(class|className)\s*=\s*\{\s*[\'"`](?:[^\'"]*\s+)?' + r'\b(' + re.escape(class_name) + r')\b' + r'(?:\s+[^\'"]*)?[\'"`]', 'JSX expression'),
-        
-        # classList.add/remove/toggle/contains/replace("...") with word boundaries
-        (r'classList\.(add|remove|toggle|contains|replace)\(\s*[\'"](?:[^\'"]*\s+)?' + r'\b(' + re.escape(class_name) + r')\b' + r'(?:\s+[^\'"]*)?[\'"]', 'classList method'),
-        
-        # querySelector/querySelectorAll with class selector
-        (r'querySelector(?:All)?\(\s*[\'"]\.(' + re.escape(class_name) + r')[\'"\s)]', 'querySelector'),
-        
-        # getElementsByClassName direct match
-        (r'getElementsByClassName\(\s*[\'"](' + re.escape(class_name) + r')[\'"]', 'getElementsByClassName'),
-        
-        # Direct string assignments that look like they're for class names
-        (r'(?:className|cssClass|klass|cls)\s*=\s*[\'"](?:[^\'"]*\s+)?' + r'\b(' + re.escape(class_name) + r')\b' + r'(?:\s+[^\'"]*)?[\'"]', 'class assignment'),
-        
-        # matchesSelector and closest methods
-        (r'(?:matchesSelector|matches|closest)\(\s*[\'"]\.(' + re.escape(class_name) + r')[\'"\s)]', 'matches method'),
-        
-        # Element creation with class direct assignment
-        (r'\.className\s*=\s*[\'"](?:[^\'"]*\s+)?' + r'\b(' + re.escape(class_name) + r')\b' + r'(?:\s+[^\'"]*)?[\'"]', 'className property'),
-        
-        # String literals for class name in common operations
-        (r'[\'"]\.(' + re.escape(class_name) + r')[\'"]', 'class selector string'),
-    ]
-    
-    for pattern_str, match_type in patterns:
-        pattern = re.compile(pattern_str)
+    for pattern, match_type in patterns:
+        # The class name is always the template's last group
+        class_name_group = pattern.groups
         for match in pattern.finditer(content):
-            # Find which capturing group has the actual class name
-            class_name_group = 2 if match.lastindex >= 2 else 1
+            context = match.group(0)
+            
+            if match_type in MULTI_CLASS_TYPES:
+                # The quoted value may contain several mapped classes - the value
+                # starts at the first quote (the pattern prefixes contain none)
+                value_start = match.start() + min(
+                    i for i in (context.find(b"'"), context.find(b'"'), context.find(b'`')) if i != -1)
+                for word in class_word.finditer(content, value_start, match.end() - 1):
+                    span = word.span(1)
+                    if span in seen:
+                        continue
+                    seen.add(span)
+                    results.append((word.start(1), word.end(1), word.group(1).decode("utf-8"), match_type, context))
+                continue
             
-            if class_name_group <= match.lastindex:
-                class_start = match.start(class_name_group)
-                class_end = match.end(class_name_group)
-                context = match.group(0)
-                
-                # Store the match info
-                results.append((class_start, class_end, match_type, context))
+            class_start, class_end = span = match.span(class_name_group)
+            if span in seen:
+                continue
+            seen.add(span)
+            
+            # Store the match info
+            results.append((class_start, class_end, match.group(class_name_group).decode("utf-8"),
+                            match_type, context))
     
+    # Report in file order; the sort is stable, so ties keep pattern order
+    results.sort(key=lambda reference: reference[0])
     return results
 
 
-def process_file(path: pathlib.Path, mapping: dict[str, str],
-                 args: argparse.Namespace, global_yes: bool) -> bool:
-    try:
-        content = path.read_text(encoding="utf-8")
-    except UnicodeDecodeError:
+def rewrite_file(path: pathlib.Path, mapping: dict[str, str],
+                 args: argparse.Namespace, global_yes: bool) -> tuple[bool, bytes | None]:
+    """
+    Scan one file and apply the accepted replacements in memory. Returns
+    whether anything was accepted and the new content to write, if any.
+    """
+    # Matching and rewriting work on the raw bytes; only displayed lines are decoded
+    content = path.read_bytes()
+    
+    # Cheap literal screen - most files mention none of the mapped classes
+    if not class_name_screen(tuple(mapping)).search(content):
+        return False, None
+    
+    if b"\0" in content:
         print(f"Skipping {path} - not a text file or uses unknown encoding")
-        return False
+        return False, None
         
-    original_content = content
     changed = False
     
     # Collect all changes to make
     all_changes = []
     
-    for old_class, new_class in mapping.items():
-        # Find references to this class name
-        references = find_class_references(content, old_class)
+    # Only the mapped names that occur in this file go into the fused patterns,
+    # which keeps the alternation short for the detailed scan
+    present = tuple(name for name in mapping if name.encode("utf-8") in content)
+    
+    # Find references to every mapped class name in one scan per pattern
+    references = find_class_references(content, present)
+    
+    # Offsets where each line starts, for line lookups by binary search
+    line_starts = [0]
+    newline = content.find(b'\n')
+    while newline != -1:
+        line_starts.append(newline + 1)
+        newline = content.find(b'\n', newline + 1)
+    
+    # Only set up the terminal when we will actually prompt
+    interactive = not (args.all_yes or args.dry_run or global_yes)
+    with raw_tty() if interactive else nullcontext():
+        for class_start, class_end, old_class, match_type, context in references:
+            new_class = mapping[old_class]
         
-        for class_start, class_end, match_type, context in references:
             # Get the line number for display
-            line_num = content.count('\n', 0, class_start) + 1
-            
+            line_num = bisect.bisect_right(line_starts, class_start)
+        
             # Extract the full line for context
-            line_start = content.rfind('\n', 0, class_start) + 1
-            line_end = content.find('\n', class_start)
-            if line_end == -1:
-                line_end = len(content)
-            
-            line = content[line_start:line_end]
-            
+            line_start = line_starts[line_num - 1]
+            line_end = line_starts[line_num] - 1 if line_num < len(line_starts) else len(content)
+        
+            if content[line_end - 1:line_end] == b'\r':
+                line_end -= 1
+        
             # Create highlighted line with the class name highlighted
-            highlight_pos = class_start - line_start
             highlight_line = (
-                line[:highlight_pos] +
-                f"{ANSI_YELLOW}" + line[highlight_pos:highlight_pos + (class_end - class_start)] + f"{ANSI_RESET}" +
-                line[highlight_pos + (class_end - class_start):]
+                content[line_start:class_start].decode("utf-8", errors="replace") +
+                f"{ANSI_YELLOW}" + content[class_start:class_end].decode("utf-8") + f"{ANSI_RESET}" +
+                content[class_end:line_end].decode("utf-8", errors="replace")
             )
-            
+        
             print(f"\n{path}:{line_num} [{match_type}]")
             print(f"  {highlight_line}")
-            
+        
             if args.all_yes or global_yes:
                 choice = "y"
             elif args.dry_run:
                 choice = "n"
             else:
                 choice = prompt(f"Replace '{old_class}' → '{new_class}'?")
-            
+        
             if choice == "a":
                 global_yes = True
                 choice = "y"
             if choice == "s":
-                return changed
+                return changed, None
             if choice == "y":
-                all_changes.append((class_start, class_end, new_class))
+                all_changes.append((class_start, class_end, new_class.encode("utf-8")))
                 changed = True
-    
-    # Apply all changes from end to start to avoid position shifts
+
+    # Apply all changes in one forward pass, joining the untouched segments
     if changed and not args.dry_run:
-        # Sort changes in reverse order by start position
-        all_changes.sort(reverse=True)
+        all_changes.sort()
         
-        # Apply the changes
+        parts = []
+        cursor = 0
         for start, end, replacement in all_changes:
-            content = content[:start] + replacement + content[end:]
-        
-        # Save the modified content
-        if not args.no_backup:
-            copy2(path, str(path) + ".bak")
-        path.write_text(content, encoding="utf-8")
-        print(f"{ANSI_GREEN}» wrote {path}{ANSI_RESET}")
+            # A span reported by more than one pattern is only replaced once
+            if start < cursor:
+                continue
+            parts.append(content[cursor:start])
+            parts.append(replacement)
+            cursor = end
+        parts.append(content[cursor:])
+        return changed, b"".join(parts)
     
+    return changed, None
+
+
+def write_file(path: pathlib.Path, content: bytes, args: argparse.Namespace) -> None:
+    # Save the modified content
+    if not args.no_backup:
+        copy2(path, str(path) + ".bak")
+    path.write_bytes(content)
+    print(f"{ANSI_GREEN}» wrote {path}{ANSI_RESET}")
+
+
+def process_file(path: pathlib.Path, mapping: dict[str, str],
+                 args: argparse.Namespace, global_yes: bool) -> bool:
+    changed, content = rewrite_file(path, mapping, args, global_yes)
+    if content is not None:
+        write_file(path, content, args)
     return changed
 
 
+def process_file_batch(path: pathlib.Path, mapping: dict[str, str],
+                       args: argparse.Namespace) -> tuple[bool, str, bytes | None]:
+    """
+    Non-interactive rewrite_file for pool workers: returns the report and the
+    new content instead of printing and writing, so the parent can emit
+    reports and write files in file order.
+    """
+    report = io.StringIO()
+    with redirect_stdout(report):
+        changed, content = rewrite_file(path, mapping, args, False)
+    return changed, report.getvalue(), content
+
+
 def main(argv: list[str] | None = None) -> None:
     p = argparse.ArgumentParser(description="Interactive CSS class renamer for JS sources")
     p.add_argument("roots", nargs="+",
@@ -225,21 +347,47 @@ def main(argv: list[str] | None = None) -> None:
                    help="Automatically answer 'yes' to every prompt")
     p.add_argument("--no-backup", action="store_true",
                    help="Do NOT write .bak files beside modified sources")
+    p.add_argument("--jobs", type=int, default=None,
+                   help="Worker processes for --all-yes / --dry-run (default: one per CPU)")
     args = p.parse_args(argv)
 
     mapping = load_mapping(args)
 
-    any_changes = False
-    global_yes = False
+    files = []
     for root in args.roots:
         path_root = pathlib.Path(root)
-        files = [path_root] if path_root.is_file() else [
+        files.extend([path_root] if path_root.is_file() else [
             p for g in JS_FILE_GLOB for p in path_root.rglob(g)
-        ]
+        ])
+    # Each file once, even if reached from overlapping roots; two workers on
+    # the same file would race, and a chained mapping would apply twice
+    unique_files = []
+    seen_files = set()
+    for file_path in files:
+        if not file_path.is_file():
+            continue
+        real_path = os.path.realpath(file_path)
+        if real_path not in seen_files:
+            seen_files.add(real_path)
+            unique_files.append(file_path)
+    files = unique_files
+
+    any_changes = False
+    global_yes = False
+    if args.all_yes or args.dry_run:
+        # Nothing to ask, so files can be scanned independently across processes
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = executor.map(partial(process_file_batch, mapping=mapping, args=args),
+                                   files, chunksize=16)
+            for file_path, (changed, report, content) in zip(files, results):
+                sys.stdout.write(report)
+                if content is not None:
+                    write_file(file_path, content, args)
+                any_changes = any_changes or changed
+    else:
         for file_path in files:
-            if file_path.is_file():
-                if process_file(file_path, mapping, args, global_yes):
-                    any_changes = True
+            if process_file(file_path, mapping, args, global_yes):
+                any_changes = True
     if args.dry_run and any_changes:
         sys.exit(1)   # non-zero to signal "changes would be made"
 
@@ -9,18 +9,54 @@ Improved Token Analysis and Update Script for Respond SPA
 5. Shows file diffs between original and updated versions
 """
 
+import io
 import os
 import re
 import json
-import difflib
+import mmap
 import argparse
+import sys
 import cssutils
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from functools import lru_cache, partial
 from pathlib import Path
+from shutil import copy2, copymode
 
 # Suppress cssutils parsing warnings
 cssutils.log.setLevel(40)  # ERROR level only
 
+# Linear-time RE2 engine for the usage scan when google-re2 is installed
+try:
+    import re2
+except ImportError:
+    re2 = re
+
+# Multi-literal search for the mapped tokens when pyahocorasick is installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# var(--token) references, matched against the mapped file bytes
+TOKEN_USAGE_RE = re2.compile(rb'var\(\s*(--[a-zA-Z0-9_-]+)\s*\)')
+
+ROOT_BLOCK_RE = re.compile(rb':root\s*{([^}]+)}', re.DOTALL)
+TOKEN_DEFINITION_RE = re.compile(rb'(--[a-zA-Z0-9_-]+)\s*:')
+
+# JSON report writer - orjson serializes large reports much faster when installed.
+# Anything else JSON can't represent is written as its str(), as before
+try:
+    import orjson
+    def write_json(path, data):
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2))
+except ImportError:
+    def write_json(path, data):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=str)
+
 # Key mappings for rationalized tokens - ONLY include tokens that need migration
 TOKEN_MAPPINGS = {
     # Theme surfaces - heavily used so keep these
@@ -55,89 +91,284 @@ TOKEN_MAPPINGS = {
     "--background-color-content": "--background-subtle"
 }
 
+@contextmanager
+def map_file(file_path):
+    """Yield a read-only mmap of a file for a single sequential scan"""
+    with open(file_path, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            # Let the kernel read ahead and drop pages behind the scan (Unix only)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                buf.madvise(mmap.MADV_SEQUENTIAL)
+                buf.madvise(mmap.MADV_WILLNEED)
+            yield buf
+
 def extract_defined_tokens(css_file):
     """Extract all tokens defined in a CSS file"""
     defined_tokens = set()
     
-    with open(css_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Find all CSS variable declarations in :root
-    root_blocks = re.findall(r':root\s*{([^}]+)}', content, re.DOTALL)
-    for block in root_blocks:
-        # Extract variable declarations
-        var_matches = re.findall(r'(--[a-zA-Z0-9_-]+)\s*:', block)
-        defined_tokens.update(var_matches)
+    with map_file(css_file) as content:
+        # Find all CSS variable declarations in :root
+        for block in ROOT_BLOCK_RE.findall(content):
+            # Extract variable declarations
+            defined_tokens.update(token.decode('ascii') for token in TOKEN_DEFINITION_RE.findall(block))
     
     return defined_tokens
 
-def analyze_token_usage(files):
-    """Analyze token usage patterns in CSS and JS files"""
-    token_usage = defaultdict(lambda: {"count": 0, "files": set()})
-    token_pattern = r'var\(\s*(--[a-zA-Z0-9_-]+)\s*\)'
-    
-    for file_path in files:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-            
-        # Find all CSS variable usages
-        matches = re.findall(token_pattern, content)
-        for token in matches:
-            token_usage[token]["count"] += 1
-            token_usage[token]["files"].add(file_path)
-    
-    return token_usage
+def scan_token_usage(file_path):
+    """Return every var(--token) reference in a file"""
+    with map_file(file_path) as content:
+        # Many files (most JS) have no var() at all - a plain substring search
+        # rules them out before the regex. find() as mmap's "in" tests single bytes
+        if content.find(b'var(') == -1:
+            return []
+        # Token names are ASCII - only the captured names are decoded. Interned
+        # so repeats share one object, which pickle then sends back only once
+        return [sys.intern(token.decode('ascii')) for token in TOKEN_USAGE_RE.findall(content)]
 
-def update_tokens_in_file(file_path, token_mappings, dry_run=False, show_diff=False):
-    """Update token references in a file"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+def analyze_token_usage(files, executor=None):
+    """Analyze token usage patterns in CSS and JS files, scanning them in executor if given"""
+    counts = Counter()
+    files_of = defaultdict(set)
+    
+    # Files are scanned independently; results are merged here in file order
+    if executor:
+        results = executor.map(scan_token_usage, files, chunksize=32)
+    else:
+        results = map(scan_token_usage, files)
     
-    updated_content = content
-    changes_made = False
-    
-    # Process each token mapping
-    for old_token, new_token in token_mappings.items():
-        # Handle direct color values (hex codes) vs CSS variables differently
-        if new_token.startswith('#'):
-            # Direct color value - no var() wrapper needed
-            old_pattern = r'var\(\s*' + re.escape(old_token) + r'\s*\)'
-            new_value = new_token  # Use direct value without var()
-            if re.search(old_pattern, updated_content):
-                updated_content = re.sub(old_pattern, new_value, updated_content)
-                changes_made = True
+    for file_path, matches in zip(files, results):
+        # Find all CSS variable usages - Counter.update counts them in C, and
+        # keeps the first key object it sees, so each name is stored once
+        counts.update(matches)
+        for token in set(matches):
+            files_of[token].add(file_path)
+    
+    return {token: {"count": count, "files": files_of[token]} for token, count in counts.items()}
+
+def token_alternation(tokens):
+    """
+    Regex matching any of the tokens, factored into a prefix tree
+    (--t(?:able-...|heme-...)) so a non-mapped token fails after a character
+    or two instead of being compared against every alternative in turn
+    """
+    tree = {}
+    for token in tokens:
+        node = tree
+        for char in token:
+            node = node.setdefault(char, {})
+        node[''] = {}  # a token ends here
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A token ending here may also be the prefix of a longer one
+        return f'(?:{body})?' if '' in node else body
+    
+    return build(tree)
+
+@lru_cache(maxsize=None)
+def compile_token_patterns(mapping_items):
+    """
+    Compile an alternation pattern for var(--old) references, and one that also
+    matches ': --old;' property assignments for CSS files, with the
+    replacements for each old token. Patterns and replacements are bytes, to
+    run on the raw file contents
+    """
+    alternation = token_alternation(old_token for old_token, _ in mapping_items).encode('ascii')
+    var_reference = rb'var\(\s*(' + alternation + rb')\s*\)'
+    var_pattern = re.compile(var_reference)
+    css_pattern = re.compile(var_reference + rb'|:\s*(' + alternation + rb')\s*;')
+    
+    # Handle direct color values (hex codes) vs CSS variables differently:
+    # a direct value needs no var() wrapper
+    var_values = {old_token.encode(): (new_token if new_token.startswith('#') else f'var({new_token})').encode()
+                  for old_token, new_token in mapping_items}
+    property_values = {old_token.encode(): f': {new_token};'.encode() for old_token, new_token in mapping_items}
+    return var_pattern, css_pattern, var_values, property_values
+
+@lru_cache(maxsize=None)
+def mapped_token_screen(mapping_items):
+    """
+    Return a check for whether content (bytes) mentions any old token at all,
+    so files without one skip the replacement regex - one Aho-Corasick pass
+    when available, otherwise a substring search per token
+    """
+    old_tokens = [old_token.encode('ascii') for old_token, _ in mapping_items]
+    if ahocorasick:
+        automaton = ahocorasick.Automaton()
+        if ahocorasick.unicode:
+            # The default build only searches str; latin-1 maps each byte to
+            # one character without any decoding work
+            for old_token in old_tokens:
+                automaton.add_word(old_token.decode('latin-1'), True)
+            automaton.make_automaton()
+            return lambda content: next(automaton.iter(content.decode('latin-1')), None) is not None
+        for old_token in old_tokens:
+            automaton.add_word(old_token, True)
+        automaton.make_automaton()
+        return lambda content: next(automaton.iter(content), None) is not None
+    return lambda content: any(old_token in content for old_token in old_tokens)
+
+def format_unified_diff(content, edits, fromfile, tofile, context=3):
+    """
+    Yield unified diff lines (bytes) for content with edits, a sorted list of
+    non-overlapping (start, end, replacement) byte spans, straight from the
+    edit positions rather than by diffing the two versions line by line.
+    Only the lines around the edits are ever located or split
+    """
+    size = len(content)
+    
+    def split_lines(chunk):
+        # Lines with their endings, split on '\n' only like the line numbers
+        lines = chunk.split(b'\n')
+        tail = lines.pop()
+        return [line + b'\n' for line in lines] + ([tail] if tail else [])
+    
+    def line_end(offset):
+        newline = content.find(b'\n', offset)
+        return size if newline == -1 else newline + 1
+    
+    # Changed blocks of old lines [first, last) - with the byte range they
+    # cover - and their edits; edits on the same or adjacent lines share a block
+    blocks = []
+    line = 0
+    counted = 0
+    for start, end, replacement in edits:
+        line += content.count(b'\n', counted, start)
+        counted = start
+        first = line
+        last = first + content.count(b'\n', start, max(start, end - 1)) + 1
+        first_start = content.rfind(b'\n', 0, start) + 1
+        last_end = line_end(max(start, end - 1))
+        if blocks and first <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], last)
+            blocks[-1][3] = max(blocks[-1][3], last_end)
+            blocks[-1][4].append((start, end, replacement))
         else:
-            # CSS variable - needs var() wrapper
-            old_pattern = r'var\(\s*' + re.escape(old_token) + r'\s*\)'
-            new_value = f'var({new_token})'
-            if re.search(old_pattern, updated_content):
-                updated_content = re.sub(old_pattern, new_value, updated_content)
-                changes_made = True
+            blocks.append([first, last, first_start, last_end, [(start, end, replacement)]])
+    
+    def new_lines(first_start, last_end, block_edits):
+        parts = []
+        cursor = first_start
+        for start, end, replacement in block_edits:
+            parts.append(content[cursor:start])
+            parts.append(replacement)
+            cursor = end
+        parts.append(content[cursor:last_end])
+        return split_lines(b''.join(parts))
+    
+    def context_before(offset):
+        # Up to `context` whole lines ending at the line start offset
+        begin = offset
+        for _ in range(context):
+            if not begin:
+                break
+            begin = content.rfind(b'\n', 0, begin - 1) + 1
+        return split_lines(content[begin:offset])
+    
+    def context_after(offset):
+        # Up to `context` whole lines starting at the line start offset
+        finish = offset
+        for _ in range(context):
+            if finish >= size:
+                break
+            finish = line_end(finish)
+        return split_lines(content[offset:finish])
+    
+    def hunk_range(start, length):
+        # Same conventions as difflib.unified_diff
+        if length == 1:
+            return f'{start + 1}'
+        if not length:
+            return f'{start},0'
+        return f'{start + 1},{length}'
+    
+    yield f'--- {fromfile}\n'.encode()
+    yield f'+++ {tofile}\n'.encode()
+    
+    # Group blocks whose surrounding context overlaps into hunks
+    hunks = []
+    for block in blocks:
+        if hunks and block[0] - hunks[-1][-1][1] <= 2 * context:
+            hunks[-1].append(block)
+        else:
+            hunks.append([block])
+    
+    line_delta = 0
+    for hunk in hunks:
+        leading = context_before(hunk[0][2])
+        trailing = context_after(hunk[-1][3])
+        hunk_start = hunk[0][0] - len(leading)
+        hunk_end = hunk[-1][1] + len(trailing)
         
-        # Replace direct property assignments for variables in CSS files
-        if file_path.endswith('.css'):
-            old_property_pattern = r':\s*' + re.escape(old_token) + r'\s*;'
-            if new_token.startswith('#'):
-                # Direct value
-                new_property_value = f': {new_token};'
-            else:
-                # CSS variable
-                new_property_value = f': {new_token};'
-            
-            if re.search(old_property_pattern, updated_content):
-                updated_content = re.sub(old_property_pattern, new_property_value, updated_content)
-                changes_made = True
+        body = [b' ' + line for line in leading]
+        new_length = len(leading)
+        cursor = hunk[0][2]
+        for first, last, first_start, last_end, block_edits in hunk:
+            # Unchanged lines between this block and the previous one
+            between = split_lines(content[cursor:first_start])
+            body.extend(b' ' + line for line in between)
+            replaced = new_lines(first_start, last_end, block_edits)
+            body.extend(b'-' + line for line in split_lines(content[first_start:last_end]))
+            body.extend(b'+' + line for line in replaced)
+            new_length += len(between) + len(replaced)
+            cursor = last_end
+        body.extend(b' ' + line for line in trailing)
+        new_length += len(trailing)
+        
+        old_length = hunk_end - hunk_start
+        yield f'@@ -{hunk_range(hunk_start, old_length)} +{hunk_range(hunk_start + line_delta, new_length)} @@\n'.encode()
+        yield from body
+        line_delta += new_length - old_length
+
+def update_tokens_in_file(file_path, token_mappings, dry_run=False, show_diff=False):
+    """Update token references in a file, working on its raw bytes throughout"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    
+    mapping_items = tuple(token_mappings.items())
+    
+    # Most files mention none of the old tokens
+    if not mapped_token_screen(mapping_items)(content):
+        return False
+    
+    var_pattern, css_pattern, var_values, property_values = compile_token_patterns(mapping_items)
+    
+    # One pass finds every mapped token - CSS files also get direct property
+    # assignments replaced
+    if file_path.endswith('.css'):
+        edits = [(m.start(), m.end(), var_values[m.group(1)] if m.group(1) else property_values[m.group(2)])
+                 for m in css_pattern.finditer(content)]
+    else:
+        edits = [(m.start(), m.end(), var_values[m.group(1)]) for m in var_pattern.finditer(content)]
+    changes_made = bool(edits)
+    
+    parts = []
+    cursor = 0
+    for start, end, replacement in edits:
+        parts.append(content[cursor:start])
+        parts.append(replacement)
+        cursor = end
+    parts.append(content[cursor:])
+    updated_content = b''.join(parts)
     
     # Show diff if requested
     if show_diff and changes_made:
         print(f"\nDiff for {file_path}:")
-        diff = difflib.unified_diff(
-            content.splitlines(keepends=True),
-            updated_content.splitlines(keepends=True),
+        diff = format_unified_diff(
+            content, edits,
             fromfile=f"{file_path} (original)",
             tofile=f"{file_path} (updated)"
         )
         for line in diff:
+            # Only the displayed lines are decoded
+            line = line.decode('utf-8', errors='replace')
             if line.startswith('+'):
                 print(f"\033[92m{line}\033[0m", end='')  # Green for additions
             elif line.startswith('-'):
@@ -147,17 +378,38 @@ def update_tokens_in_file(file_path, token_mappings, dry_run=False, show_diff=Fa
     
     # Only write if changes were made and not in dry run mode
     if changes_made and not dry_run:
-        # Create backup
+        # Create backup - a hard link keeps the original bytes without copying them
         backup_file = f"{file_path}.bak"
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+        try:
+            os.unlink(backup_file)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(file_path, backup_file)
+        except OSError:
+            # No hard links on this filesystem
+            copy2(file_path, backup_file)
         
-        # Write updated content
-        with open(file_path, 'w', encoding='utf-8') as f:
+        # Write updated content to a temp file and swap it in, so the original
+        # (still linked as the backup) is never left half-written
+        tmp_file = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
             f.write(updated_content)
+        copymode(file_path, tmp_file)
+        os.replace(tmp_file, file_path)
     
     return changes_made
 
+def update_tokens_in_file_batch(file_path, token_mappings, show_diff=False):
+    """
+    update_tokens_in_file for pool workers: returns (changed, output) so the
+    parent can print diffs in file order
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        changed = update_tokens_in_file(file_path, token_mappings, dry_run=False, show_diff=show_diff)
+    return changed, output.getvalue()
+
 def generate_usage_report(token_usage, defined_tokens, component_mapping=None):
     """Generate a detailed usage report for tokens"""
     report = {
@@ -188,10 +440,15 @@ def generate_usage_report(token_usage, defined_tokens, component_mapping=None):
     # Orphaned tokens (used but not defined)
     report["orphaned_tokens"] = list(all_found_tokens - defined_tokens)
     
-    # Count tokens per file
+    # Count tokens per file, bucketing each file by type the first time it is seen
+    file_token_counts = report["file_token_counts"]
+    filetype_counts = Counter()
     for token, data in token_usage.items():
         for file_path in data["files"]:
-            report["file_token_counts"][file_path] += 1
+            if file_path not in file_token_counts:
+                filetype = 'css' if file_path.endswith('.css') else 'js' if file_path.endswith('.js') else 'other'
+                filetype_counts[filetype] += 1
+            file_token_counts[file_path] += 1
     
     # Group by component if mapping provided
     if component_mapping:
@@ -203,10 +460,9 @@ def generate_usage_report(token_usage, defined_tokens, component_mapping=None):
     
     # Count usage by file type
     report["usage_by_filetype"] = {
-        "css": sum(1 for f, c in report["file_token_counts"].items() if f.endswith('.css')),
-        "js": sum(1 for f, c in report["file_token_counts"].items() if f.endswith('.js')),
-        "other": sum(1 for f, c in report["file_token_counts"].items() 
-                     if not (f.endswith('.css') or f.endswith('.js')))
+        "css": filetype_counts["css"],
+        "js": filetype_counts["js"],
+        "other": filetype_counts["other"]
     }
     
     return report
@@ -223,6 +479,8 @@ def main():
     parser.add_argument('--output-tokens', default='styles/tokens.css', help='Path for the new tokens file')
     parser.add_argument('--show-diff', action='store_true', help='Show diff between original and updated files')
     parser.add_argument('--rationalized-tokens', help='Path to rationalized tokens CSS file')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
     args = parser.parse_args()
     
     # Collect all files to process
@@ -243,7 +501,8 @@ def main():
     
     # Analyze token usage
     print(f"Analyzing token usage in {len(all_files)} files...")
-    token_usage = analyze_token_usage(all_files)
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        token_usage = analyze_token_usage(all_files, executor)
     
     # Generate a simple component mapping based on file paths
     component_mapping = {}
@@ -266,8 +525,7 @@ def main():
     os.makedirs(os.path.dirname(args.output_report), exist_ok=True)
     
     # Write report
-    with open(args.output_report, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, default=str)
+    write_json(args.output_report, report)
     
     print(f"Token usage report generated: {args.output_report}")
     print(f"Found {len(token_usage)} unique tokens across all files")
@@ -291,8 +549,8 @@ def main():
     if args.rationalized_tokens and not args.analyze_only:
         print(f"\nCopying rationalized tokens to {args.output_tokens}")
         os.makedirs(os.path.dirname(args.output_tokens), exist_ok=True)
-        with open(args.rationalized_tokens, 'r', encoding='utf-8') as src:
-            with open(args.output_tokens, 'w', encoding='utf-8') as dst:
+        with open(args.rationalized_tokens, 'rb') as src:
+            with open(args.output_tokens, 'wb') as dst:
                 dst.write(src.read())
     
     # Update tokens in files if not analyze-only
@@ -312,12 +570,17 @@ def main():
             files_to_update = all_files
             print("Updating all files")
         
-        for file_path in files_to_update:
-            if update_tokens_in_file(file_path, TOKEN_MAPPINGS, 
-                                      dry_run=False, show_diff=args.show_diff):
-                files_updated += 1
-                if not args.show_diff:  # Only print if we didn't show the diff
-                    print(f"Updated: {file_path}")
+        # Files are updated independently; diffs are printed here in file order
+        update_file = partial(update_tokens_in_file_batch, token_mappings=TOKEN_MAPPINGS,
+                              show_diff=args.show_diff)
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = executor.map(update_file, files_to_update, chunksize=32)
+            for file_path, (changed, output) in zip(files_to_update, results):
+                print(output, end='')
+                if changed:
+                    files_updated += 1
+                    if not args.show_diff:  # Only print if we didn't show the diff
+                        print(f"Updated: {file_path}")
         
         print(f"\nToken update complete. Updated {files_updated} out of {len(files_to_update)} files.")
         print("Backup files created with .bak extension")
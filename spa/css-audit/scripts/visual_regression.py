@@ -6,12 +6,23 @@ Take screenshots of components before and after CSS changes and compare them.
 """
 
 import os
+import hashlib
 import argparse
 import asyncio
-from PIL import Image, ImageChops
+from collections import namedtuple
+from PIL import Image
 import numpy as np
 from playwright.async_api import async_playwright
 
+# Non-cryptographic hash for unchanged-screenshot detection - prefer xxhash when installed
+try:
+    import xxhash
+    def _fingerprint(data):
+        return xxhash.xxh3_64_hexdigest(data)
+except ImportError:
+    def _fingerprint(data):
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
 # Component mapping to URLs/selectors
 COMPONENT_SELECTORS = {
     # Core stage components from Functional Overview
@@ -155,117 +166,218 @@ COMPONENT_SELECTORS = {
     }
 }
 
-async def take_component_screenshots(base_url, components, output_dir, auth=None):
-    """Take screenshots of specified components"""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        context = await browser.new_context(viewport={"width": 1280, "height": 800})
-        page = await context.new_page()
-        
-        # Handle authentication if needed
-        if auth:
-            await page.goto(f"{base_url}/login")
-            await page.fill("input[name='username']", auth['username'])
-            await page.fill("input[name='password']", auth['password'])
-            await page.click("button[type='submit']")
+# Flattened once at load so the capture loop reads attributes, not dict keys
+Component = namedtuple('Component', 'name url selector trigger')
+COMPONENTS = {
+    name: Component(name, config['url'], config['selector'], config.get('trigger'))
+    for name, config in COMPONENT_SELECTORS.items()
+}
+
+# Browser contexts capturing screenshots at the same time
+CONCURRENCY = 4
+
+# Largest per-channel change (0-255) still treated as the same pixel; absorbs
+# antialiasing and font rendering noise between runs
+PIXEL_TOLERANCE = 4
+
+async def login(page, base_url, auth):
+    """Sign in on the given page"""
+    await page.goto(f"{base_url}/login")
+    await page.fill("input[name='username']", auth['username'])
+    await page.fill("input[name='password']", auth['password'])
+    await page.click("button[type='submit']")
+    await page.wait_for_load_state("networkidle")
+
+async def capture_component(page, base_url, component, output_dir, navigate=True):
+    """
+    Screenshot one component on the given page, returning its path or None.
+    Pass navigate=False when the page is already showing component.url.
+    """
+    try:
+        # Navigate to the page
+        if navigate:
+            full_url = f"{base_url}{component.url}"
+            await page.goto(full_url)
             await page.wait_for_load_state("networkidle")
         
+        # If there's a trigger to open modal/dialog
+        if component.trigger:
+            try:
+                await page.click(component.trigger)
+                await page.wait_for_selector(component.selector, state="visible")
+            except Exception as e:
+                print(f"Error triggering {component.name}: {e}")
+                return None
+        
+        # Wait for the component to be visible
+        try:
+            element = await page.wait_for_selector(component.selector, timeout=5000)
+        except Exception:
+            print(f"Component not found: {component.name} at {component.selector}")
+            return None
+        
+        # Take screenshot of the component
+        output_path = os.path.join(output_dir, f"{component.name}.png")
+        await element.screenshot(path=output_path)
+        print(f"Screenshot taken: {component.name}")
+        
+        # If we opened a modal, close it
+        if component.trigger:
+            try:
+                await page.press("body", "Escape")
+                await page.wait_for_selector(component.selector, state="hidden", timeout=1000)
+            except:
+                # Modal might not have closed, but we can continue
+                pass
+        
+        return output_path
+        
+    except Exception as e:
+        print(f"Error capturing {component.name}: {e}")
+        return None
+
+async def take_component_screenshots(base_url, components, output_dir, auth=None, concurrency=CONCURRENCY):
+    """Take screenshots of specified components, several browser contexts at a time"""
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
         os.makedirs(output_dir, exist_ok=True)
-        results = {}
         
-        for component_name, config in components.items():
+        # Group components by page so each worker visits a URL once
+        items = sorted(components, key=lambda component: component.url)
+        workers = max(1, min(concurrency, len(items)))
+        batch_size = -(-len(items) // workers)
+        
+        async def capture_batch(batch):
+            # Each worker has its own context and page (and login); its
+            # components are captured one after another on that page
+            context = await browser.new_context(viewport={"width": 1280, "height": 800})
             try:
-                # Navigate to the page
-                full_url = f"{base_url}{config['url']}"
-                await page.goto(full_url)
-                await page.wait_for_load_state("networkidle")
-                
-                # If there's a trigger to open modal/dialog
-                if 'trigger' in config:
-                    try:
-                        await page.click(config['trigger'])
-                        await page.wait_for_selector(config['selector'], state="visible")
-                    except Exception as e:
-                        print(f"Error triggering {component_name}: {e}")
-                        continue
-                
-                # Wait for the component to be visible
-                try:
-                    element = await page.wait_for_selector(config['selector'], timeout=5000)
-                except Exception:
-                    print(f"Component not found: {component_name} at {config['selector']}")
-                    continue
+                page = await context.new_page()
                 
-                # Take screenshot of the component
-                output_path = os.path.join(output_dir, f"{component_name}.png")
-                await element.screenshot(path=output_path)
-                results[component_name] = output_path
-                print(f"Screenshot taken: {component_name}")
+                # Handle authentication if needed
+                if auth:
+                    await login(page, base_url, auth)
                 
-                # If we opened a modal, close it
-                if 'trigger' in config:
-                    try:
-                        await page.press("body", "Escape")
-                        await page.wait_for_selector(config['selector'], state="hidden", timeout=1000)
-                    except:
-                        # Modal might not have closed, but we can continue
-                        pass
+                shots = {}
+                current_url = None
+                for component in batch:
+                    output_path = await capture_component(page, base_url, component, output_dir,
+                                                          navigate=component.url != current_url)
+                    if output_path:
+                        shots[component.name] = output_path
+                    # A page is only reused after a clean capture with no modal opened
+                    current_url = component.url if output_path and not component.trigger else None
                 
-            except Exception as e:
-                print(f"Error capturing {component_name}: {e}")
+                return shots
+            finally:
+                # Other batches are still running on the same browser
+                await context.close()
+        
+        # Split the sorted components into contiguous runs and capture them concurrently
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        captured = {}
+        for shots in await asyncio.gather(*(capture_batch(batch) for batch in batches)):
+            captured.update(shots)
         
         await browser.close()
-        return results
+        
+        # Report in the original component order
+        return {component.name: captured[component.name] for component in components
+                if component.name in captured}
+
+def _load_cached(path):
+    """
+    Decode a screenshot to an RGB uint8 array, reusing the .npy saved next to it
+    while that is newer than the PNG.
+    """
+    cache_path = path + '.npy'
+    try:
+        if os.stat(cache_path).st_mtime >= os.stat(path).st_mtime:
+            return np.load(cache_path)
+    except FileNotFoundError:
+        pass
+    
+    with Image.open(path) as img:
+        arr = np.asarray(img.convert("RGB"), dtype=np.uint8)
+    try:
+        np.save(cache_path, arr)
+    except OSError:
+        # Read-only baselines still compare, just without the cache
+        pass
+    return arr
 
-def compare_screenshots(before_dir, after_dir, components, threshold=0.05):
-    """Compare before and after screenshots and calculate difference percentage"""
+def _resize(arr, width, height):
+    """Resample an RGB array to width x height, leaving it untouched if it already fits"""
+    if arr.shape[1] == width and arr.shape[0] == height:
+        return arr
+    return np.asarray(Image.fromarray(arr).resize((width, height), Image.LANCZOS), dtype=np.uint8)
+
+def compare_screenshots(before_dir, after_dir, components, threshold=0.05, pixel_tolerance=PIXEL_TOLERANCE):
+    """
+    Compare before and after screenshots and calculate difference percentage.
+    A pixel only counts as changed when a channel moves by more than pixel_tolerance.
+    """
     results = {}
     
     for component in components:
         before_path = os.path.join(before_dir, f"{component}.png")
         after_path = os.path.join(after_dir, f"{component}.png")
         
-        if not os.path.exists(before_path) or not os.path.exists(after_path):
-            results[component] = {
-                "error": "Missing screenshot",
-                "diff_percent": 100.0
-            }
-            continue
-        
         try:
-            # Open images
-            before_img = Image.open(before_path)
-            after_img = Image.open(after_path)
+            # Byte-identical PNGs cannot differ, so skip decoding them
+            try:
+                with open(before_path, 'rb') as f:
+                    before_hash = _fingerprint(f.read())
+                with open(after_path, 'rb') as f:
+                    after_hash = _fingerprint(f.read())
+            except FileNotFoundError:
+                results[component] = {
+                    "error": "Missing screenshot",
+                    "diff_percent": 100.0
+                }
+                continue
+            
+            if before_hash == after_hash:
+                results[component] = {
+                    "diff_percent": 0.0,
+                    "status": "PASS"
+                }
+                continue
+            
+            # Decoded pixels (cached as .npy between runs)
+            before_arr = _load_cached(before_path)
+            after_arr = _load_cached(after_path)
             
             # Ensure same size for comparison
-            if before_img.size != after_img.size:
+            if before_arr.shape != after_arr.shape:
                 # Resize to smallest dimensions
-                width = min(before_img.width, after_img.width)
-                height = min(before_img.height, after_img.height)
-                before_img = before_img.resize((width, height))
-                after_img = after_img.resize((width, height))
+                height = min(before_arr.shape[0], after_arr.shape[0])
+                width = min(before_arr.shape[1], after_arr.shape[1])
+                before_arr = _resize(before_arr, width, height)
+                after_arr = _resize(after_arr, width, height)
             
-            # Calculate difference
-            diff_img = ImageChops.difference(before_img, after_img)
-            
-            # Save difference image
-            diff_dir = os.path.join(os.path.dirname(after_dir), "diff")
-            os.makedirs(diff_dir, exist_ok=True)
-            diff_path = os.path.join(diff_dir, f"{component}_diff.png")
-            diff_img.save(diff_path)
+            # Per-channel absolute difference in int16 (uint8 would wrap), then
+            # pixels whose largest channel change is above the tolerance
+            channel_diff = np.subtract(before_arr, after_arr, dtype=np.int16)
+            np.abs(channel_diff, out=channel_diff)
+            diff_mask = channel_diff.max(axis=-1) > pixel_tolerance
             
             # Calculate difference percentage
-            diff_array = np.array(diff_img)
-            non_zero = np.count_nonzero(diff_array)
-            total_pixels = diff_array.size / 3  # RGB has 3 channels
-            diff_percent = (non_zero / total_pixels) * 100
+            diff_percent = float(diff_mask.mean()) * 100
             
             results[component] = {
                 "diff_percent": diff_percent,
-                "diff_path": diff_path,
                 "status": "PASS" if diff_percent <= threshold else "FAIL"
             }
             
+            # Save a difference mask (changed pixels in white) for failures only
+            if diff_percent > threshold:
+                diff_dir = os.path.join(os.path.dirname(after_dir), "diff")
+                os.makedirs(diff_dir, exist_ok=True)
+                diff_path = os.path.join(diff_dir, f"{component}_diff.png")
+                Image.fromarray(diff_mask.astype(np.uint8) * 255).save(diff_path)
+                results[component]["diff_path"] = diff_path
+            
         except Exception as e:
             results[component] = {
                 "error": str(e),
@@ -284,20 +396,24 @@ async def main():
     parser.add_argument('--mode', choices=['capture-before', 'capture-after', 'compare'], required=True, 
                         help='Mode: capture before/after screenshots or compare them')
     parser.add_argument('--threshold', type=float, default=0.05, help='Difference threshold percentage (0-100)')
+    parser.add_argument('--pixel-tolerance', type=int, default=PIXEL_TOLERANCE,
+                        help='Per-channel change (0-255) ignored when comparing pixels')
     parser.add_argument('--auth-user', help='Username for authentication')
     parser.add_argument('--auth-pass', help='Password for authentication')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='Number of components captured at the same time')
     args = parser.parse_args()
     
     # Determine which components to test
-    component_configs = {}
+    components = []
     if args.components:
         for component in args.components:
-            if component in COMPONENT_SELECTORS:
-                component_configs[component] = COMPONENT_SELECTORS[component]
+            if component in COMPONENTS:
+                components.append(COMPONENTS[component])
             else:
                 print(f"Unknown component: {component}")
     else:
-        component_configs = COMPONENT_SELECTORS
+        components = list(COMPONENTS.values())
     
     # Auth config if provided
     auth = None
@@ -309,17 +425,20 @@ async def main():
     
     if args.mode == 'capture-before':
         # Take screenshots before changes
-        await take_component_screenshots(args.base_url, component_configs, args.before_dir, auth)
+        await take_component_screenshots(args.base_url, components, args.before_dir, auth,
+                                         args.concurrency)
         print(f"Before screenshots captured in {args.before_dir}")
         
     elif args.mode == 'capture-after':
         # Take screenshots after changes
-        await take_component_screenshots(args.base_url, component_configs, args.after_dir, auth)
+        await take_component_screenshots(args.base_url, components, args.after_dir, auth,
+                                         args.concurrency)
         print(f"After screenshots captured in {args.after_dir}")
         
     elif args.mode == 'compare':
         # Compare screenshots
-        results = compare_screenshots(args.before_dir, args.after_dir, component_configs.keys(), args.threshold)
+        results = compare_screenshots(args.before_dir, args.after_dir, [c.name for c in components], args.threshold,
+                                      args.pixel_tolerance)
         
         # Print results
         print("\nVisual Regression Test Results:")
@@ -1,11 +1,45 @@
 # process_llm_output.py
 
 import argparse
+import logging
+import mmap
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Linear-time RE2 engine for the filename and backtick scans when google-re2 is installed
+try:
+    import re2
+except ImportError:
+    re2 = re
+
+# Common patterns for file paths, fused into one scan. Groups are in priority order
+FILENAME_RE = re2.compile(
+    r'(?:File:|//\s*File:|#\s*File:)\s*([\w\-./]+\.\w+)'  # File: or // File: or # File:
+    r'|//\s*([\w\-./]+\.\w+)'  # // path/to/file.ext
+    r'|#\s*([\w\-./]+\.\w+)'   # # path/to/file.ext
+)
+
+# Code blocks are marked with ```, optionally tagged with their language.
+# These are matched against the raw (UTF-8) bytes of the LLM output
+FENCE = b'```'
+FENCE_LANGUAGES = (b'js', b'javascript', b'python', b'')
+BACKTICKS_RE = re2.compile(rb'```')
+
+# How far before a code block to look for its filename, in characters
+PRECEDING_CHARS = 500
+
+# Local files at least this large are not read just to show their line count
+LINE_COUNT_MAX_BYTES = 10 * 1024 * 1024
+
+# Directories write_file has already created during this run
+_created_dirs = set()
 
 @dataclass
 class CodeBlock:
@@ -15,106 +49,234 @@ class CodeBlock:
 
 def extract_filename(text: str, check_first_lines: bool = False) -> Optional[str]:
     """Extract filename from text using various patterns."""
-    # Common patterns for file paths
-    patterns = [
-        r'(?:File:|//\s*File:|#\s*File:)\s*([\w\-./]+\.\w+)',  # File: or // File: or # File:
-        r'//\s*([\w\-./]+\.\w+)',  # // path/to/file.ext
-        r'#\s*([\w\-./]+\.\w+)',   # # path/to/file.ext
-    ]
-    
-    print("Searching for filename in text...")
+    logger.debug("Searching for filename in text...")
     
     if check_first_lines:
         # For code blocks, check only first few lines
-        lines = text.split('\n')[:3]  # Check first 3 lines
+        lines = text.split('\n', 3)[:3]  # Check first 3 lines, without splitting the rest
         text_to_check = '\n'.join(lines)
     else:
         text_to_check = text
 
-    print("Checking text:")
-    print("-" * 40)
-    print(text_to_check[:200] + "..." if len(text_to_check) > 200 else text_to_check)
-    print("-" * 40)
-    
-    for pattern in patterns:
-        print(f"Trying pattern: {pattern}")
-        match = re.search(pattern, text_to_check)
-        if match:
-            filename = match.group(1)
-            print(f"Found filename: {filename}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Checking text:")
+        logger.debug("-" * 40)
+        logger.debug(text_to_check[:200] + "..." if len(text_to_check) > 200 else text_to_check)
+        logger.debug("-" * 40)
+    
+    logger.debug("Trying pattern: %s", FILENAME_RE.pattern)
+    # First match of each kind; a File: marker ends the scan as nothing beats it
+    found = [None, None, None]
+    for match in FILENAME_RE.finditer(text_to_check):
+        for kind, filename in enumerate(match.groups()):
+            if filename and not found[kind]:
+                found[kind] = filename
+        if found[0]:
+            break
+    
+    for filename in found:
+        if filename:
+            logger.debug("Found filename: %s", filename)
             return filename
     
-    print("No filename found in this text segment")
+    logger.debug("No filename found in this text segment")
     return None
 
-def extract_code_blocks(content: str) -> List[CodeBlock]:
-    """Extract code blocks and their associated filenames from the content."""
-    print("\nSearching for code blocks...")
-    print(f"Total content length: {len(content)} characters")
+@contextmanager
+def map_file(filepath: str):
+    """Yield a read-only mmap of a file, or b'' for an empty one."""
+    with open(filepath, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+def find_code_blocks(content: bytes) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Yield (fence position, end position, body) for each ```lang\n...``` block - the body runs
+    to the next ``` - by walking the fences with find, so unclosed fences
+    in truncated output cost one scan rather than one per opening fence.
+    content may be bytes or an mmap.
+    """
+    pos = 0
+    while True:
+        fence = content.find(FENCE, pos)
+        if fence == -1:
+            return
+        body_start = -1
+        tag_start = fence + len(FENCE)
+        for language in FENCE_LANGUAGES:
+            tag_end = tag_start + len(language) + 1
+            if content[tag_start:tag_end] == language + b'\n':
+                body_start = tag_end
+                break
+        if body_start == -1:
+            # Not an opening fence - look again from the next character
+            pos = fence + 1
+            continue
+        close = content.find(FENCE, body_start)
+        if close == -1:
+            # Nothing after this can be closed either
+            return
+        pos = close + len(FENCE)
+        yield fence, pos, content[body_start:close]
+
+def extract_code_blocks(content: bytes) -> List[CodeBlock]:
+    """
+    Extract code blocks and their associated filenames from the content - the
+    UTF-8 bytes (or mmap) of the LLM output, of which only the code blocks and
+    the text just before them are decoded.
+    """
+    logger.debug("\nSearching for code blocks...")
+    logger.debug("Total content length: %d bytes", len(content))
+    
+    # Reading as text used to turn \r\n and \r into \n; keep doing that
+    if content.find(b'\r') != -1:
+        content = bytes(content).replace(b'\r\n', b'\n').replace(b'\r', b'\n')
     
     # First, let's see if we can find any ``` markers at all
-    all_backticks = re.findall(r'```', content)
-    print(f"Found {len(all_backticks)} ``` markers in total")
+    if logger.isEnabledFor(logging.DEBUG):
+        all_backticks = BACKTICKS_RE.findall(content)
+        logger.debug("Found %d ``` markers in total", len(all_backticks))
     
     # Find all code blocks marked with ```
     code_blocks = []
-    # Modified pattern to be more permissive and print what it finds
-    code_pattern = re.compile(r'```(?:js|javascript|python)?\n(.*?)```', re.DOTALL)
-    
-    matches = code_pattern.finditer(content)
     match_count = 0
+    # Where the text since the previous block starts - filename hints are only
+    # taken from there, so each stretch of text is searched at most once and
+    # never picks up a name from inside the previous block's code
+    text_start = 0
     
-    for match in matches:
+    for fence, block_end, block_bytes in find_code_blocks(content):
         match_count += 1
-        print(f"\nFound code block #{match_count}:")
-        block_content = match.group(1)
-        print(f"Code block length: {len(block_content)} characters")
-        print(f"First few lines of code block:")
-        print("-" * 40)
-        print('\n'.join(block_content.splitlines()[:5]))
-        print("...")
+        block_content = block_bytes.decode('utf-8')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\nFound code block #%d:", match_count)
+            logger.debug("Code block length: %d characters", len(block_content))
+            logger.debug("First few lines of code block:")
+            logger.debug("-" * 40)
+            # The first five lines without splitting the whole block; a block
+            # this short is cheap to split as before
+            lines = block_content.split('\n', 5)
+            logger.debug('\n'.join(lines[:5] if len(lines) > 5 else block_content.splitlines()))
+            logger.debug("...")
         
         # First try to find filename in the code block itself
         filename = extract_filename(block_content, check_first_lines=True)
         
         # If not found, try looking in preceding text
         if not filename:
-            start_pos = max(0, match.start() - 500)
-            preceding_text = content[start_pos:match.start()]
-            print(f"\nNo filename found in code block, searching preceding text (length: {len(preceding_text)} chars)")
+            # Enough bytes for PRECEDING_CHARS characters of up to 4 bytes each,
+            # less a character possibly cut at the start of the window
+            start_pos = max(text_start, fence - 4 * PRECEDING_CHARS - 3)
+            preceding_text = content[start_pos:fence].decode('utf-8', errors='ignore')[-PRECEDING_CHARS:]
+            logger.debug("\nNo filename found in code block, searching preceding text (length: %d chars)",
+                         len(preceding_text))
             filename = extract_filename(preceding_text)
         
         if filename:
             code_block = CodeBlock(
                 filename=filename,
                 content=block_content,
-                line_count=len(block_content.splitlines())
+                # Lines ended by '\n' (also covers '\r\n'), plus a final unterminated
+                # line. Unlike splitlines(), a lone '\r', '\v', '\f', '\x1c'-'\x1e',
+                # '\x85', '\u2028' or '\u2029' does not start a new line
+                line_count=block_content.count('\n') + (bool(block_content) and not block_content.endswith('\n'))
             )
             code_blocks.append(code_block)
-            print(f"Added code block with filename: {filename} ({code_block.line_count} lines)")
+            logger.debug("Added code block with filename: %s (%d lines)", filename, code_block.line_count)
         else:
-            print("Warning: No filename found for this code block")
+            logger.warning("No filename found for code block #%d", match_count)
+        
+        text_start = block_end
     
     if match_count == 0:
-        print("\nNo code blocks found with pattern ```...```")
+        logger.warning("No code blocks found with pattern ```...```")
         # Let's examine the content more closely
-        print("\nFirst 500 characters of content:")
-        print("-" * 40)
-        print(content[:500])
-        print("-" * 40)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\nFirst 500 characters of content:")
+            logger.debug("-" * 40)
+            logger.debug(content[:500].decode('utf-8', errors='replace'))
+            logger.debug("-" * 40)
     
-    print(f"\nTotal code blocks found with filenames: {len(code_blocks)}")
+    logger.debug("\nTotal code blocks found with filenames: %d", len(code_blocks))
     return code_blocks
 
+def dedupe_code_blocks(code_blocks: List[CodeBlock]) -> List[CodeBlock]:
+    """
+    Keep one block per file. A file given more than once (e.g. when the LLM
+    restarted its answer) keeps its first position and its last content, as
+    if every block had been written in turn; differing repeats are warned about.
+    """
+    latest = {}
+    for block in code_blocks:
+        filepath = os.path.normpath(block.filename)
+        previous = latest.get(filepath)
+        if previous is not None and previous.content != block.content:
+            logger.warning("%s appears in several code blocks with different content; using the last one",
+                           block.filename)
+        latest[filepath] = block
+    return list(latest.values())
+
 def get_local_file_line_count(filepath: str) -> Optional[int]:
     """Get line count of local file if it exists."""
-    if os.path.exists(filepath):
-        with open(filepath, 'r') as f:
-            return len(f.readlines())
-    return None
+    # Count newlines a chunk at a time rather than holding every line
+    lines = 0
+    last_chunk = b''
+    try:
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                lines += chunk.count(b'\n')
+                last_chunk = chunk
+    except FileNotFoundError:
+        return None
+    # A final line without a newline still counts
+    return lines + (bool(last_chunk) and not last_chunk.endswith(b'\n'))
+
+def ensure_dir(dirpath: str):
+    """Create a directory if it doesn't exist, once per run."""
+    if dirpath != '.' and dirpath not in _created_dirs:
+        os.makedirs(dirpath, exist_ok=True)
+        _created_dirs.add(dirpath)
+
+def local_file_sizes(filepaths: Iterable[str]) -> Dict[str, int]:
+    """Sizes of the given files that exist, from one scandir per directory."""
+    wanted = {os.path.normpath(filepath) for filepath in filepaths}
+    sizes = {}
+    for dirpath in {os.path.dirname(filepath) or '.' for filepath in wanted}:
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    filepath = os.path.normpath(entry.path)
+                    if filepath in wanted and entry.is_file():
+                        sizes[filepath] = entry.stat().st_size
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+    return sizes
 
-def write_file(filepath: str, content: str):
-    """Write content to file, creating directories if needed."""
+def describe_local_files(code_blocks: List[CodeBlock]) -> Dict[str, str]:
+    """Local line count (or why there is none) for each block's file, keyed by normalized path."""
+    sizes = local_file_sizes(block.filename for block in code_blocks)
+    descriptions = {}
+    for block in code_blocks:
+        filepath = os.path.normpath(block.filename)
+        size = sizes.get(filepath)
+        if size is None:
+            descriptions[filepath] = 'File not found'
+        elif size >= LINE_COUNT_MAX_BYTES:
+            descriptions[filepath] = f'not counted ({size} bytes)'
+        else:
+            local_lines = get_local_file_line_count(filepath)
+            descriptions[filepath] = str(local_lines) if local_lines is not None else 'File not found'
+    return descriptions
+
+def write_file(filepath: str, content: str) -> bool:
+    """
+    Write content to file, creating directories if needed. Returns False, without
+    touching the file, when it already holds exactly this content.
+    """
     if not filepath or not filepath.strip():
         raise ValueError("Filepath cannot be empty")
         
@@ -130,78 +292,129 @@ def write_file(filepath: str, content: str):
         filepath = os.path.join('.', filepath)
         dirpath = '.'
         
-    print(f"Creating directory: {dirpath}")
-    print(f"Writing to file: {filepath}")
+    logger.debug("Creating directory: %s", dirpath)
+    logger.debug("Writing to file: %s", filepath)
     
     # Create directory if it doesn't exist
-    if dirpath != '.':
-        os.makedirs(dirpath, exist_ok=True)
+    ensure_dir(dirpath)
         
-    # Write the file
-    with open(filepath, 'w') as f:
-        f.write(content)
+    # Write the file - encoded once, with no newline translation
+    data = content.encode('utf-8')
+    
+    # Leave an identical file alone so its mtime (and any build cache keyed on
+    # it) is kept; only a file of the same size needs reading to tell
+    try:
+        if os.path.getsize(filepath) == len(data):
+            with open(filepath, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+    
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return True
+
+def parse_selection(text: str, count: int) -> Optional[List[int]]:
+    """Parse block numbers like "1 3-5,7" into sorted 0-based indexes, or None if invalid."""
+    selected = set()
+    for part in text.replace(',', ' ').split():
+        first, _, last = part.partition('-')
+        if not first.isdigit() or (last and not last.isdigit()):
+            return None
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= count:
+            return None
+        selected.update(range(first - 1, last))
+    return sorted(selected)
 
 def main():
     parser = argparse.ArgumentParser(description='Process LLM output and update local files.')
     parser.add_argument('llm_output_file', help='Path to LLM output file')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('-y', '--yes', action='store_true', help='Update all files without asking')
+    parser.add_argument('--dry-run', action='store_true', help='List the code blocks without writing anything')
     args = parser.parse_args()
+    
+    # Diagnostics from the extraction only show with --debug
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING, format='%(message)s')
 
     print(f"Processing file: {args.llm_output_file}")
     
-    # Read LLM output file
+    # Map the LLM output file and extract its code blocks; only the blocks are
+    # ever decoded, so the whole output is never held as a str
     try:
-        with open(args.llm_output_file, 'r') as f:
-            content = f.read()
-            print(f"Successfully read file. Content length: {len(content)} characters")
+        with map_file(args.llm_output_file) as content:
+            print(f"Successfully read file. Content length: {len(content)} bytes")
+            code_blocks = dedupe_code_blocks(extract_code_blocks(content))
     except FileNotFoundError:
         print(f"Error: File {args.llm_output_file} not found")
         sys.exit(1)
     except Exception as e:
         print(f"Error reading file: {str(e)}")
         sys.exit(1)
-
-    # Extract code blocks
-    code_blocks = extract_code_blocks(content)
     
     if not code_blocks:
         print("\nNo code blocks found in the file.")
         sys.exit(0)
 
-    # Display found code blocks and their info
+    # Display found code blocks and their info; local files are looked up once
+    # here and the result reused below
+    local_files = describe_local_files(code_blocks)
     print("\nFound code blocks:")
     print("-" * 60)
     for i, block in enumerate(code_blocks, 1):
-        local_lines = get_local_file_line_count(block.filename)
         print(f"{i}. {block.filename}")
         print(f"   LLM code lines: {block.line_count}")
-        print(f"   Local file lines: {local_lines if local_lines is not None else 'File not found'}")
+        print(f"   Local file lines: {local_files[os.path.normpath(block.filename)]}")
         print()
 
-    # Ask user to proceed
-    response = input("\nProceed with updating local files? (yes/no): ").lower()
-    if response != 'yes':
-        print("Operation cancelled.")
+    if args.dry_run:
+        print("Dry run - no files were modified.")
         sys.exit(0)
 
+    # Ask user to proceed once, for all files or a selection of them
+    if not args.yes:
+        response = input(f"\nProceed with updating {len(code_blocks)} files? (yes/no/select): ").lower()
+        if response == 'select':
+            selection = parse_selection(input("Files to update (e.g. 1 3-5): "), len(code_blocks))
+            if not selection:
+                print("No valid files selected. Operation cancelled.")
+                sys.exit(0)
+            code_blocks = [code_blocks[i] for i in selection]
+        elif response != 'yes':
+            print("Operation cancelled.")
+            sys.exit(0)
+
     # Process each code block
     for block in code_blocks:
-        local_lines = get_local_file_line_count(block.filename)
         print(f"\nProcessing: {block.filename}")
         print(f"LLM code lines: {block.line_count}")
-        print(f"Local file lines: {local_lines if local_lines is not None else 'File not found'}")
-        
-        key = input("Press Enter to update this file (any other key to exit): ")
-        if key:
-            print("Operation cancelled.")
-            sys.exit(0)
-        
-        try:
-            write_file(block.filename, block.content)
-            print(f"Updated: {block.filename}")
-        except Exception as e:
-            print(f"Error updating {block.filename}: {str(e)}")
-            sys.exit(1)
+        print(f"Local file lines: {local_files[os.path.normpath(block.filename)]}")
+    
+    # Create the directories here so the writer threads never race on them;
+    # blocks are one per file, so each file is written by a single thread
+    for block in code_blocks:
+        ensure_dir(os.path.dirname(os.path.normpath(block.filename)) or '.')
+    
+    # Writes are I/O bound and release the GIL, so they overlap in threads.
+    # Results are reported in block order
+    failed = False
+    with ThreadPoolExecutor(max_workers=min(32, len(code_blocks))) as executor:
+        futures = [(block, executor.submit(write_file, block.filename, block.content))
+                   for block in code_blocks]
+        for block, future in futures:
+            try:
+                if future.result():
+                    print(f"Updated: {block.filename}")
+                else:
+                    print(f"Unchanged: {block.filename}")
+            except Exception as e:
+                print(f"Error updating {block.filename}: {str(e)}")
+                failed = True
+    
+    if failed:
+        sys.exit(1)
 
     print("\nAll files updated successfully!")
 